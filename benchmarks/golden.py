@@ -0,0 +1,255 @@
+#!/usr/bin/python
+#
+# golden.py: Check spectral classification against a stored golden corpus
+# Copyright (C) 2016  Andrew Tribick
+#
+# This program is free software; you can redistribute it and/or
+# modify it under the terms of the GNU General Public License
+# as published by the Free Software Foundation; either version 2
+# of the License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston,
+# MA  02110-1301, USA.
+
+from __future__ import print_function
+from __future__ import division
+from builtins import range
+
+import argparse
+import json
+import os
+import sys
+import time
+from collections import OrderedDict
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(ROOT))
+
+from cdsread import CdsTable, ReadMe, find_datafile
+from specinfo import CelestiaSpectrum, IvoaSpectrum
+from specparse import SpecParser
+from xhipgen import ODD_TYPES
+
+DATA_DIR = os.path.join(ROOT, 'data')
+GOLDEN_FILE = os.path.join(DATA_DIR, 'golden.json')
+SPTYPES_FILE = os.path.join(DATA_DIR, 'sptypes.txt')
+CATALOG_DIR = os.path.join(DATA_DIR, 'catalog')
+
+GOLDEN_VERSION = 1
+
+# Forms that are rare or absent in XHIP but which the grammar accepts, and
+# malformed strings it has to recover from
+EDGE_CASES = (
+    'A', 'B', 'M', 'O', 'C', 'S', 'N', 'R', 'W', 'D', 'L', 'T', 'Y',
+    'A0', 'A0V', 'A0 V', 'A0v', 'A0:V', 'A0V:', 'A0V...', 'A0...',
+    'G2.5V', 'G2.75V', 'G2.V', 'G10V', 'K9.5III', 'B0.7Iab', 'O9.7Ia+',
+    'F5Ia0', 'F5 0-Ia', 'M2Iab-Ib', 'K3IIb', 'G8III/IV', 'G8III-IV',
+    'G8/K0III', 'G8-K0III', 'A7/8V', 'A7-8V', 'K1/2III', 'B9/A0IV/V',
+    'sdB', 'sdO5', 'sdM0', 'esdK7', 'usdM2', 'dK5', 'dM3e', 'gK0', 'gG8',
+    'wdA', 'DA', 'DA2', 'DAB', 'DBQ', 'DO1', 'DQ6', 'DX', 'DZA', 'DAP',
+    'WR', 'WN', 'WN7', 'WC8', 'WO4', 'WN5+O6', 'WC7+O5-8', 'OB', 'OBN',
+    'OC9.7Ia', 'BN2.5Ib', 'BC1.5Iab', 'MS5', 'SC4/6', 'NS', 'PG1159',
+    'C-R2', 'C-N5', 'C-J4', 'C-H3', 'C-Hd', 'C5,4', 'C6,3e', 'C4,5J',
+    'R5', 'N3', 'S3.5/2', 'S7/1e', 'S4,2', 'M3S', 'MS3', 'M5IIIe-M6IIIe',
+    'kA2hA5mA7V', 'kB9hA0VHgMn', 'kA3hF0mF2', 'hA5mA7', 'Am', 'Ap', 'Fm',
+    'A0p SiCr', 'A0pSrCrEu', 'B9p Hg-Mn', 'B9pHgMn', 'A2VpSrCr', 'Bp Si',
+    'A1Vm', 'A5mA9-F2', 'G8IIIbFe-1', 'G8IIIFe-0.5', 'K1IIIbCN1.5Ca1',
+    'K0IIIb CN-1', 'K0III CN+1', 'G5Ba0.5', 'K0IIIBa2', 'G9IIIbCH1',
+    'F4Vkf2', 'F0Vkf8', 'A9III-IVvar', 'K0III-IV:var', 'M6e-M9e',
+    'M8III:e', 'B5Ve(shell)', 'B2IVe(n)', 'B1Ve+sh', 'B8IIIne', 'B3Vnne',
+    'B9.5Vn', 'A0Vs', 'A3Vnn', 'O8V((f))', 'O6.5V((f))', 'O9.5V(f)',
+    'O4If+', 'O3If*', 'O5e', 'B1Ia+', 'B0.5Iae', 'B[e]', 'B2[e]',
+    'K2III+F5V', 'A5V+F0', 'G5IV+A', 'F0V+...', 'K0+...', 'M1III+A',
+    'K3V + M0V', 'A0V+A0V+A0V', 'G0V+G0V', 'DA+dM', 'B9IV+B9IV+A0V',
+    'F2/3IV/V', 'K5/M0III', 'G6/8III:', 'M0III-IIIa', 'G5IV-V',
+    'B2 IV-V', 'B2IV-Vn', 'A1IVs', 'K0IV-V(k)', 'F8V(w)', 'F7Vw',
+    'G0Vnfe', 'A0Vpec', 'K4III pec', 'M4 III e', 'K2 IIIb', 'G8 III',
+    'A0 (IV)', 'A0(V)', '(A0)V', 'A0[V]', 'A0V (Si)', 'B5V+(e)',
+    'F0(((', 'F0)))', 'F0[[[', 'F0]]]', 'F0((e)', 'F0[e', 'F0(e)(e)(e)',
+    'K0III...', 'K0...III', '...', 'A+', 'A-', 'A/', 'A,', 'A:',
+    '+A0V', '/A0V', '-A0V', ':A0V', 'A0V-', 'A0V/', 'A0V,',
+    'K 0 III', 'K0  III', 'K0III  ', '  K0III', 'K0\tIII', 'K0III ?',
+    'K0III!', 'K0III#', 'K0III*', 'K0III&', 'K0III.5', 'K0III 1.5',
+    'K0III 1 2 3', 'K0V 0.5 1.5 2.5', 'K0.5.5V', 'K0..5V', 'K00V',
+    'K0000V', 'K0III Ba Sr', 'K0III shell', 'K0III CN1 CH-2 Fe-1',
+    'x', 'xyz', '0', '1.5', 'III', 'Ia', 'V', 'e', 'p', 'm', 'var',
+    'SrCrEu', 'HgMn', 'Si', 'CN', '?', '??', '(?)', '[?]', 'a0v', 'ao',
+)
+
+def _native(value):
+    # json gives unicode strings under Python 2
+    if isinstance(value, list):
+        return [_native(item) for item in value]
+    if isinstance(value, type(u'')):
+        return str(value)
+    return value
+
+def load_golden(filename=GOLDEN_FILE):
+    with open(filename) as f:
+        data = json.load(f)
+    if data.get('version') != GOLDEN_VERSION:
+        raise ValueError('%s has version %s, expected %d' %
+                         (filename, data.get('version'), GOLDEN_VERSION))
+    return [tuple(_native(entry)) for entry in data['entries']]
+
+def save_golden(filename, entries):
+    # One entry per line, sorted, so that changes show up as readable diffs
+    with open(filename, 'w') as f:
+        f.write('{"version": %d, "entries": [\n' % GOLDEN_VERSION)
+        f.write(',\n'.join(json.dumps(list(entry), separators=(',', ': '))
+                           for entry in sorted(entries)))
+        f.write('\n]}\n')
+
+def catalog_sptypes(catalog):
+    # The distinct SpType strings of a catalogue directory in the XHIP layout
+    readme = ReadMe(os.path.join(catalog, 'ReadMe'))
+    sptypes = CdsTable(find_datafile(os.path.join(catalog, 'main.dat')),
+                       readme, ('SpType',))['SpType']
+    return set(str(sptype) for sptype in sptypes.compressed())
+
+def corpus_sptypes(golden, catalogs):
+    sptypes = set(sptype for sptype, _, _, _ in golden)
+    with open(SPTYPES_FILE) as f:
+        sptypes.update(line.rstrip('\n') for line in f if line.strip())
+    sptypes.update(ODD_TYPES)
+    sptypes.update(EDGE_CASES)
+    for catalog in [CATALOG_DIR] + catalogs:
+        sptypes.update(catalog_sptypes(catalog))
+    return sorted(sptypes)
+
+def specinfo_fields(specinfo):
+    if specinfo is None:
+        return None
+    return [specinfo.tclass, specinfo.subclass, specinfo.lclass,
+            [list(pec) for pec in specinfo.pecs], specinfo.comp]
+
+class Timer(object):
+    def __init__(self):
+        self.times = OrderedDict()
+
+    def time(self, name, func, *args):
+        start = time.time()
+        result = func(*args)
+        self.times[name] = self.times.get(name, 0) + time.time() - start
+        return result
+#end class Timer
+
+def classify_single(sptypes, timer):
+    # One string at a time through the full grammar, as SpecCache.classify
+    # does for strings that fail the fast path
+    parser = SpecParser()
+    specinfos = timer.time('parse', lambda: [parser.parse(sptype)
+                                             for sptype in sptypes])
+    ivoas = timer.time('ivoa', lambda: [IvoaSpectrum.create(specinfo)
+                                        for specinfo in specinfos])
+    celestia = timer.time('celestia', lambda: [
+        CelestiaSpectrum.from_ivoa(ivoa).code for ivoa in ivoas])
+    return specinfos, [ivoa.code for ivoa in ivoas], celestia
+
+def classify_batch(sptypes, timer):
+    # The batch path of a build: parse_many with the canonical fast path,
+    # then the codes of all strings as arrays
+    parser = SpecParser()
+    specinfos = timer.time('parse_many', lambda: [
+        specinfo for specinfo, _ in parser.parse_many(sptypes)])
+    ivoa = timer.time('ivoa_codes', IvoaSpectrum.codes, specinfos)
+    celestia = timer.time('celestia_codes', CelestiaSpectrum.codes_from_ivoa,
+                          ivoa)
+    return specinfos, ivoa.tolist(), celestia.tolist()
+
+PATHS = OrderedDict([
+    ('single', classify_single),
+    ('batch', classify_batch),
+])
+
+def compare(path, golden, specinfos, ivoa_codes, celestia_codes):
+    # Returns a message for each value that differs from the corpus
+    mismatches = []
+    for (sptype, fields, ivoa, celestia), specinfo, ivoa_code, celestia_code \
+            in zip(golden, specinfos, ivoa_codes, celestia_codes):
+        for name, expected, actual in (
+                ('SpecInfo', fields, specinfo_fields(specinfo)),
+                ('IVOA code', ivoa, ivoa_code),
+                ('Celestia code', celestia, celestia_code)):
+            if expected != actual:
+                mismatches.append('%s %r: %s %r, expected %r' %
+                                  (path, sptype, name, actual, expected))
+    return mismatches
+
+def report(path, timer, count):
+    total = sum(timer.times.values())
+    for name, seconds in list(timer.times.items()) + [('total', total)]:
+        print('%-7s %-15s %9.2f ms %12.0f strings/s' %
+              (path, name, seconds*1000,
+               count / seconds if seconds > 0 else float('inf')))
+
+def main():
+    argparser = argparse.ArgumentParser(
+        description='Check spectral type classification against the golden '
+                    'corpus and report its throughput.')
+    argparser.add_argument('--golden', default=GOLDEN_FILE,
+                           help='golden corpus file')
+    argparser.add_argument('--update', action='store_true',
+                           help='record the current results as the golden '
+                                'corpus instead of checking them')
+    argparser.add_argument('--catalog', action='append', default=[],
+                           metavar='DIR',
+                           help='with --update, also add the spectral types '
+                                'of the XHIP catalogue in DIR; may be '
+                                'repeated')
+    argparser.add_argument('--show', type=int, default=20,
+                           help='number of mismatches to print (default 20)')
+    args = argparser.parse_args()
+
+    if args.update:
+        golden = load_golden(args.golden) if os.path.exists(args.golden) \
+                 else []
+        sptypes = corpus_sptypes(golden, args.catalog)
+    else:
+        if args.catalog:
+            argparser.error('--catalog is only used with --update')
+        golden = load_golden(args.golden)
+        sptypes = [sptype for sptype, _, _, _ in golden]
+    print('%d spectral types in %s' % (len(sptypes), args.golden))
+
+    results = OrderedDict()
+    for path, classify in PATHS.items():
+        timer = Timer()
+        results[path] = classify(sptypes, timer)
+        report(path, timer, len(sptypes))
+
+    if args.update:
+        # the two paths must agree before their results are recorded
+        specinfos, ivoa_codes, celestia_codes = results['single']
+        entries = [(sptype, specinfo_fields(specinfo), ivoa, celestia)
+                   for sptype, specinfo, ivoa, celestia
+                   in zip(sptypes, specinfos, ivoa_codes, celestia_codes)]
+        mismatches = compare('batch', entries, *results['batch'])
+    else:
+        mismatches = []
+        for path, result in results.items():
+            mismatches += compare(path, golden, *result)
+
+    for message in mismatches[:args.show]:
+        print(message)
+    if len(mismatches) > args.show:
+        print('... and %d more' % (len(mismatches) - args.show))
+    if mismatches:
+        print('%d mismatches' % len(mismatches))
+        sys.exit(1)
+
+    if args.update:
+        save_golden(args.golden, entries)
+        print('Saved %d spectral types to %s' % (len(entries), args.golden))
+    else:
+        print('All %d spectral types match' % len(sptypes))
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,88 @@
+#!/usr/bin/python
+#
+# parallel.py: Benchmark multi-process spectral classification
+# Copyright (C) 2016  Andrew Tribick
+#
+# This program is free software; you can redistribute it and/or
+# modify it under the terms of the GNU General Public License
+# as published by the Free Software Foundation; either version 2
+# of the License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston,
+# MA  02110-1301, USA.
+
+from __future__ import print_function
+from __future__ import division
+from builtins import range
+
+import argparse
+import itertools
+import multiprocessing
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from speccache import SpecCache, worker_pool
+
+TCLASSES = ('O', 'B', 'A', 'F', 'G', 'K', 'M', 'C', 'S', 'DA', 'WN', 'sdB')
+LCLASSES = ('', 'V', 'III', 'III-IV', 'Ib', 'IV/V', 'Iab')
+SUFFIXES = ('', 'e', 'p', 'n', 'ne', ' CN-1', 'm', 'p SrCrEu', '+F5V',
+            '...', ':', ' Ba0.5', 'var', ' (Hg)')
+
+def corpus():
+    subclasses = ['%g' % (x / 2) for x in range(20)]
+    return [t + s + l + p for t, s, l, p in
+            itertools.product(TCLASSES, subclasses, LCLASSES, SUFFIXES)]
+
+def classify(sptypes, jobs):
+    cache = SpecCache()
+    start = time.time()
+    pool = worker_pool(jobs)
+    try:
+        codes = cache.classify_many(sptypes, pool)
+    finally:
+        if pool is not None:
+            pool.close()
+            pool.join()
+    return time.time() - start, codes
+
+def main():
+    argparser = argparse.ArgumentParser(
+        description='Measure classification scaling with worker count.')
+    argparser.add_argument('-j', '--max-jobs', type=int,
+                           default=multiprocessing.cpu_count(),
+                           help='largest number of worker processes')
+    args = argparser.parse_args()
+
+    sptypes = corpus()
+    print('Classifying', len(sptypes), 'distinct spectral types')
+
+    jobs = [1]
+    while jobs[-1] * 2 <= args.max_jobs:
+        jobs.append(jobs[-1] * 2)
+    if jobs[-1] != args.max_jobs:
+        jobs.append(args.max_jobs)
+
+    baseline, expected = classify(sptypes, 1)
+    print('%4s %10s %8s' % ('jobs', 'seconds', 'speedup'))
+    print('%4d %10.3f %8.2f' % (1, baseline, 1))
+    for n in jobs[1:]:
+        elapsed, codes = classify(sptypes, n)
+        if not all((a == b).all() for a, b in zip(codes, expected)):
+            print('Results with', n, 'jobs differ from the serial run')
+            sys.exit(1)
+        print('%4d %10.3f %8.2f' % (n, elapsed, baseline / elapsed))
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,78 @@
+#!/usr/bin/python
+#
+# startup.py: Benchmark SpecParser construction time
+# Copyright (C) 2016  Andrew Tribick
+#
+# This program is free software; you can redistribute it and/or
+# modify it under the terms of the GNU General Public License
+# as published by the Free Software Foundation; either version 2
+# of the License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston,
+# MA  02110-1301, USA.
+
+from __future__ import print_function
+from __future__ import division
+from builtins import range
+
+import argparse
+import os
+import subprocess
+import sys
+import timeit
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+# Run in a fresh interpreter so nothing is cached from a previous parser
+COLD_START = '''
+import time
+start = time.time()
+from specparse import SpecParser
+imported = time.time()
+SpecParser(tables=%r)
+print(repr(imported - start) + ' ' + repr(time.time() - imported))
+'''
+
+def cold_start(tables, repeat):
+    env = dict(os.environ, PYTHONPATH=ROOT)
+    results = []
+    for _ in range(repeat):
+        output = subprocess.check_output(
+            [sys.executable, '-c', COLD_START % tables], env=env)
+        results.append([float(v) for v in output.split()])
+    return results
+
+def warm_start(tables, repeat):
+    from specparse import SpecParser
+    timer = timeit.Timer(lambda: SpecParser(tables=tables))
+    return [t for t in timer.repeat(repeat, 1)]
+
+def report(label, times):
+    times = sorted(times)
+    print('%-34s min %8.2f ms   median %8.2f ms' %
+          (label, times[0]*1000, times[len(times)//2]*1000))
+
+def main():
+    argparser = argparse.ArgumentParser(
+        description='Measure SpecParser start-up time.')
+    argparser.add_argument('-n', '--repeat', type=int, default=10,
+                           help='number of runs per measurement')
+    args = argparser.parse_args()
+
+    for tables in (True, False):
+        label = 'prebuilt tables' if tables else 'grammar reflection'
+        results = cold_start(tables, args.repeat)
+        report('import (%s)' % label, [r[0] for r in results])
+        report('cold start (%s)' % label, [r[1] for r in results])
+        report('warm start (%s)' % label, warm_start(tables, args.repeat))
+
+if __name__ == '__main__':
+    main()
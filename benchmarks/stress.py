@@ -0,0 +1,95 @@
+#!/usr/bin/python
+#
+# stress.py: Benchmark SpecLexer on long and adversarial spectral types
+# Copyright (C) 2016  Andrew Tribick
+#
+# This program is free software; you can redistribute it and/or
+# modify it under the terms of the GNU General Public License
+# as published by the Free Software Foundation; either version 2
+# of the License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston,
+# MA  02110-1301, USA.
+
+from __future__ import print_function
+from __future__ import division
+from builtins import range
+
+import argparse
+import os
+import sys
+import time
+from collections import OrderedDict
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from specparse import SpecLexer, SpecParser
+
+# Each pattern builds a string of roughly n characters
+PATTERNS = OrderedDict([
+    ('numbers', lambda n: 'K0III ' + ' '.join(['1.5'] * (n // 4))),
+    ('spaced numbers', lambda n: 'K0' + '    5' * (n // 5)),
+    ('nested parens', lambda n: 'B5Ve' + '(' * (n // 2) + ')' * (n // 2)),
+    ('paren groups', lambda n: 'B5Ve' + '(e)' * (n // 3)),
+    ('unclosed parens', lambda n: 'O8V' + '((f' * (n // 3)),
+    ('bracket groups', lambda n: 'A0' + '[e]' * (n // 3)),
+    ('peculiarities', lambda n: 'A0p' + ' SiCrEu' * (n // 7)),
+    ('ranges', lambda n: 'K0' + '-1/2' * (n // 4) + 'III'),
+])
+
+def tokenize(lexer, data):
+    lexer.input(data)
+    count = 0
+    while lexer.token():
+        count += 1
+    return count
+
+def measure(function, data, repeat):
+    best = None
+    for _ in range(repeat):
+        start = time.time()
+        function(data)
+        elapsed = time.time() - start
+        if best is None or elapsed < best:
+            best = elapsed
+    return best
+
+def main():
+    argparser = argparse.ArgumentParser(
+        description='Measure how lexing and parsing time grows with the '
+                    'length of adversarial spectral types.')
+    argparser.add_argument('--sizes', type=int, nargs='+',
+                           default=[100, 1000, 10000, 50000],
+                           help='string lengths to try')
+    argparser.add_argument('-n', '--repeat', type=int, default=3,
+                           help='number of runs per string')
+    argparser.add_argument('--parse', action='store_true',
+                           help='time the full parse as well as the lexer')
+    args = argparser.parse_args()
+
+    lexer = SpecLexer().lexer
+    parser = SpecParser()
+    stages = [('lex', lambda data: tokenize(lexer, data))]
+    if args.parse:
+        stages.append(('parse', parser.parse))
+
+    print('%-16s %-6s' % ('pattern', 'stage') +
+          ''.join('%12s' % ('n=%d' % n) for n in args.sizes) +
+          '   us/char at largest')
+    for name, pattern in PATTERNS.items():
+        for stage, function in stages:
+            times = [measure(function, pattern(n), args.repeat)
+                     for n in args.sizes]
+            print('%-16s %-6s' % (name, stage) +
+                  ''.join('%10.2fms' % (t * 1000) for t in times) +
+                  '   %8.3f' % (times[-1] * 1e6 / len(pattern(args.sizes[-1]))))
+
+if __name__ == '__main__':
+    main()
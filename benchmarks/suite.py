@@ -0,0 +1,257 @@
+#!/usr/bin/python
+#
+# suite.py: Benchmark the spectral type pipeline and the full build
+# Copyright (C) 2016  Andrew Tribick
+#
+# This program is free software; you can redistribute it and/or
+# modify it under the terms of the GNU General Public License
+# as published by the Free Software Foundation; either version 2
+# of the License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston,
+# MA  02110-1301, USA.
+
+from __future__ import print_function
+from __future__ import division
+from builtins import range
+
+import argparse
+import atexit
+import glob
+import json
+import os
+import platform
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from collections import OrderedDict
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from specinfo import CelestiaSpectrum, IvoaSpectrum
+from specparse import SpecLexer, SpecParser
+
+DATA_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data')
+CORPUS_FILE = os.path.join(DATA_DIR, 'sptypes.txt')
+CATALOG_DIR = os.path.join(DATA_DIR, 'catalog')
+BASELINE_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                             'baselines.json')
+
+def load_corpus(filename=CORPUS_FILE):
+    with open(filename) as f:
+        return [line.rstrip('\n') for line in f if line.strip()]
+
+# Each benchmark takes the corpus and returns (run, items): run() performs
+# one timed pass over items inputs
+
+def bench_lexer(corpus):
+    lexer = SpecLexer().lexer
+    def run():
+        for sptype in corpus:
+            lexer.input(sptype)
+            while lexer.token():
+                pass
+    return run, len(corpus)
+
+def bench_parser(corpus):
+    parser = SpecParser()
+    def run():
+        for sptype in corpus:
+            parser.parse(sptype)
+    return run, len(corpus)
+
+def bench_parse_many(corpus):
+    parser = SpecParser()
+    def run():
+        for _ in parser.parse_many(corpus):
+            pass
+    return run, len(corpus)
+
+def bench_canonical(corpus):
+    def run():
+        for sptype in corpus:
+            SpecParser.parse_canonical(sptype)
+    return run, len(corpus)
+
+def _specinfos(corpus):
+    parser = SpecParser()
+    return [parser.parse(sptype) for sptype in corpus]
+
+def bench_ivoa(corpus):
+    specinfos = _specinfos(corpus)
+    def run():
+        for specinfo in specinfos:
+            IvoaSpectrum.create(specinfo)
+    return run, len(specinfos)
+
+def bench_pppp(corpus):
+    args = []
+    for specinfo in _specinfos(corpus):
+        if specinfo:
+            ivoa = IvoaSpectrum.create(specinfo)
+            args.append((specinfo, ivoa.TT_code, ivoa.LL_code))
+    def run():
+        for specinfo, TT_code, LL_code in args:
+            IvoaSpectrum._get_PPPP(specinfo, TT_code, LL_code)
+    return run, len(args)
+
+def bench_celestia(corpus):
+    specinfos = _specinfos(corpus)
+    def run():
+        for specinfo in specinfos:
+            CelestiaSpectrum.create(specinfo)
+    return run, len(specinfos)
+
+def bench_ivoa_codes(corpus):
+    specinfos = _specinfos(corpus)
+    def run():
+        IvoaSpectrum.codes(specinfos)
+    return run, len(specinfos)
+
+def bench_celestia_codes(corpus):
+    ivoa_codes = IvoaSpectrum.codes(_specinfos(corpus))
+    def run():
+        CelestiaSpectrum.codes_from_ivoa(ivoa_codes)
+    return run, len(ivoa_codes)
+
+def bench_build(corpus, catalog=CATALOG_DIR):
+    # A clean build of the fixture catalogue in a scratch directory; the
+    # checkpoint and caches are removed before every run
+    workdir = tempfile.mkdtemp(prefix='xhip-bench-')
+    atexit.register(shutil.rmtree, workdir, True)
+    for filename in glob.glob(os.path.join(ROOT, '*.py')):
+        shutil.copy(filename, workdir)
+    for filename in os.listdir(catalog):
+        shutil.copy(os.path.join(catalog, filename), workdir)
+    with open(os.path.join(catalog, 'main.dat')) as f:
+        rows = sum(1 for _ in f)
+
+    def run():
+        for name in ('xhip.checkpoint', 'speccache.json',
+                     'stars.manifest.npz'):
+            path = os.path.join(workdir, name)
+            if os.path.isdir(path):
+                shutil.rmtree(path)
+            elif os.path.exists(path):
+                os.remove(path)
+        with open(os.devnull, 'w') as devnull:
+            subprocess.check_call([sys.executable, 'buildstardb.py'],
+                                  cwd=workdir, stdout=devnull)
+    return run, rows
+
+BENCHMARKS = OrderedDict([
+    ('lexer', bench_lexer),
+    ('parser', bench_parser),
+    ('parse_many', bench_parse_many),
+    ('canonical', bench_canonical),
+    ('ivoa', bench_ivoa),
+    ('pppp', bench_pppp),
+    ('celestia', bench_celestia),
+    ('ivoa_codes', bench_ivoa_codes),
+    ('celestia_codes', bench_celestia_codes),
+    ('build', bench_build),
+])
+
+def measure(setup, corpus, repeat):
+    run, items = setup(corpus)
+    run()   # warm up
+    times = []
+    for _ in range(repeat):
+        start = time.time()
+        run()
+        times.append(time.time() - start)
+    times.sort()
+    return OrderedDict([
+        ('items', items),
+        ('min', times[0]),
+        ('median', times[len(times)//2]),
+    ])
+
+def load_baselines(filename):
+    if not os.path.exists(filename):
+        return {}
+    with open(filename) as f:
+        return json.load(f).get('results', {})
+
+def save_baselines(filename, results):
+    with open(filename, 'w') as f:
+        json.dump(OrderedDict([('python', platform.python_version()),
+                               ('machine', platform.machine()),
+                               ('results', results)]),
+                  f, indent=2, separators=(',', ': '))
+        f.write('\n')
+
+def report(name, result, baseline, threshold):
+    # Returns True if the benchmark is slower than the baseline by more
+    # than threshold
+    per_item = result['min'] / max(result['items'], 1)
+    line = '%-14s %7d items  min %9.2f ms  median %9.2f ms  %8.2f us/item' % (
+        name, result['items'], result['min']*1000, result['median']*1000,
+        per_item*1e6)
+    regressed = False
+    if baseline and baseline.get('items') == result['items']:
+        ratio = result['min'] / baseline['min']
+        regressed = ratio > 1 + threshold
+        line += '  %5.2fx baseline%s' % (ratio,
+                                        '  REGRESSION' if regressed else '')
+    print(line)
+    return regressed
+
+def main():
+    argparser = argparse.ArgumentParser(
+        description='Benchmark spectral type parsing, classification and '
+                    'the full stars.dat build.')
+    argparser.add_argument('benchmarks', nargs='*', metavar='BENCHMARK',
+                           help='benchmarks to run: %s (default: all)' %
+                                ', '.join(BENCHMARKS))
+    argparser.add_argument('-n', '--repeat', type=int, default=5,
+                           help='number of timed runs per benchmark')
+    argparser.add_argument('--corpus', default=CORPUS_FILE,
+                           help='spectral types to use, one per line')
+    argparser.add_argument('--baselines', default=BASELINE_FILE,
+                           help='file holding the baseline timings')
+    argparser.add_argument('--save', action='store_true',
+                           help='store the results as the new baselines')
+    argparser.add_argument('--threshold', type=float, default=0.1,
+                           help='relative slowdown reported as a '
+                                'regression (default 0.1)')
+    args = argparser.parse_args()
+
+    for name in args.benchmarks:
+        if name not in BENCHMARKS:
+            argparser.error('unknown benchmark %s' % name)
+
+    corpus = load_corpus(args.corpus)
+    baselines = load_baselines(args.baselines)
+    names = args.benchmarks or list(BENCHMARKS)
+
+    results = OrderedDict()
+    regressions = []
+    for name in names:
+        results[name] = measure(BENCHMARKS[name], corpus, args.repeat)
+        if report(name, results[name], baselines.get(name), args.threshold):
+            regressions.append(name)
+
+    if args.save:
+        baselines.update(results)
+        save_baselines(args.baselines,
+                       OrderedDict((name, baselines[name])
+                                   for name in BENCHMARKS
+                                   if name in baselines))
+        print('Saved baselines to', args.baselines)
+    elif regressions:
+        print('Regressions:', ', '.join(regressions))
+        sys.exit(1)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,117 @@
+#!/usr/bin/python
+#
+# buildreport.py: Stage timings and counters for buildstardb.py
+# Copyright (C) 2016  Andrew Tribick
+#
+# This program is free software; you can redistribute it and/or
+# modify it under the terms of the GNU General Public License
+# as published by the Free Software Foundation; either version 2
+# of the License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston,
+# MA  02110-1301, USA.
+
+from __future__ import print_function
+from __future__ import division
+
+import json
+import os
+import platform
+import sys
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+
+try:
+    import resource
+except ImportError:
+    # not available on Windows; memory is then left out of the report
+    resource = None
+
+REPORT_VERSION = 1
+
+def cpu_time():
+    # user and system time of this process and its finished children, so
+    # that classification workers are included
+    times = os.times()
+    return times[0] + times[1] + times[2] + times[3]
+
+def peak_memory():
+    # Peak resident set size in kB of this process and of its largest
+    # child, or None where it can't be measured
+    if resource is None:
+        return None
+    scale = 1024 if sys.platform == 'darwin' else 1  # bytes on OS X
+    return OrderedDict([
+        ('self', resource.getrusage(resource.RUSAGE_SELF).ru_maxrss // scale),
+        ('children',
+         resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss // scale),
+    ])
+
+class BuildReport(object):
+    def __init__(self):
+        self.started = time.time()
+        self._cpu = cpu_time()
+        self.stages = []
+        self.counters = OrderedDict()
+
+    @contextmanager
+    def stage(self, name, rows=None):
+        # Yields the stage record, so rows can be filled in once known
+        record = OrderedDict([
+            ('name', name),
+            ('wall', None),
+            ('cpu', None),
+            ('rows', rows),
+            ('rows_per_second', None),
+            ('peak_memory_kb', None),
+        ])
+        wall = time.time()
+        cpu = cpu_time()
+        try:
+            yield record
+        finally:
+            wall = time.time() - wall
+            record['wall'] = wall
+            record['cpu'] = cpu_time() - cpu
+            if record['rows'] and wall > 0:
+                record['rows_per_second'] = record['rows'] / wall
+            record['peak_memory_kb'] = peak_memory()
+            self.stages.append(record)
+
+    def count(self, name, value):
+        self.counters[name] = int(value)
+
+    def as_dict(self):
+        wall = time.time() - self.started
+        rows = self.counters.get('rows')
+        return OrderedDict([
+            ('version', REPORT_VERSION),
+            ('started', time.strftime('%Y-%m-%dT%H:%M:%SZ',
+                                      time.gmtime(self.started))),
+            ('python', platform.python_version()),
+            ('argv', sys.argv[1:]),
+            ('total', OrderedDict([
+                ('wall', wall),
+                ('cpu', cpu_time() - self._cpu),
+                ('rows', rows),
+                ('rows_per_second', rows / wall if rows and wall > 0
+                                    else None),
+                ('peak_memory_kb', peak_memory()),
+            ])),
+            ('stages', self.stages),
+            ('counters', self.counters),
+        ])
+
+    def write(self, filename):
+        with open(filename, 'w') as f:
+            json.dump(self.as_dict(), f, indent=2, separators=(',', ': '))
+            f.write('\n')
+#end class BuildReport
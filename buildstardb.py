@@ -22,12 +22,29 @@ from __future__ import print_function
 from __future__ import division
 from builtins import range
 
+import argparse
+import os
+import shutil
 import struct
+import sys
 
-from astropy import table
-from astropy.io import ascii
-from specparse import SpecParser
+from buildreport import BuildReport
+from cdsread import CdsTable, ReadMe, find_datafile
+from checkpoint import (invalidate_checkpoint, load_checkpoint,
+                        save_checkpoint, write_manifest)
+from crossmatch import MATCH_RADIUS, merge
+from hipjoin import join, join_chunks, join_indices
+from incremental import load_manifest, row_hashes, save_manifest
+from sourcehash import source_fingerprint
+from speccache import SpecCache, worker_pool
+from staroctree import OCTREE_SUFFIX, write_octree
 from specinfo import CelestiaSpectrum
+from starsdat import (HEADER_FORMAT, INDEX_SUFFIX, MAGIC, STAR_DTYPE,
+                      VERSION, absolute_magnitudes, open_stars, write_index)
+
+import specinfo
+import specparse
+import speccache
 
 import numpy as np
 from numpy import cos,log10,radians,sin
@@ -35,74 +52,637 @@ from numpy import cos,log10,radians,sin
 OBLIQUITY = radians(23.4392911)
 LY_PER_PC = 3.26167
 
-ROTMATRIX = np.matrix((
+SPEC_CACHE_FILE = 'speccache.json'
+
+CATALOG_FILES = ('ReadMe', 'main.dat', 'photo.dat')
+CHECKPOINT_DIR = 'xhip.checkpoint'
+
+COLUMNS = ('HIP', 'RAdeg', 'DEdeg', 'Dist', 'Plx', 'e_Plx', 'Vmag', 'SpType')
+
+STARS_FILE = 'stars.dat'
+STARS_TEXT_FILE = 'stars.txt'
+SIDECAR_CSV_FILE = 'stars.csv'
+SIDECAR_NPY_FILE = 'stars.npy'
+MANIFEST_FILE = 'stars.manifest.npz'
+
+# Records are handed to the output sinks this many at a time
+BLOCK_ROWS = 1 << 16
+# Catalogue rows read and processed at a time by --stream
+STREAM_ROWS = 1 << 18
+WRITE_BUFFER = 1 << 20
+
+# Catalogue values carried alongside each star record for the text outputs;
+# distance is in light years
+EXTRA_DTYPE = np.dtype([
+    ('ra', '<f8'),
+    ('dec', '<f8'),
+    ('distance', '<f8'),
+    ('appmag', '<f8'),
+])
+
+# How each catalogue row was used
+SKIPPED = 0
+USED_DIST = 1
+USED_PLX = 2
+
+ROTMATRIX = np.array((
     (1, 0, 0),
     (0, cos(OBLIQUITY), sin(OBLIQUITY)),
     (0, -sin(OBLIQUITY), cos(OBLIQUITY))
 ))
 
-maindata = ascii.read("main.dat", readme="ReadMe")
-photdata = ascii.read("photo.dat", readme="ReadMe")
+def _values(column):
+    return np.asarray(np.ma.getdata(column))
 
-alldata = table.join(maindata, photdata, keys='HIP')
+def _mask(column):
+    return np.ma.getmaskarray(column)
 
-used_dist = 0
-used_plx = 0
-skipped = 0
+def _round(x):
+    # Python 2 round(): halves are rounded away from zero
+    absx = np.abs(x)
+    rounded = np.floor(absx)
+    rounded += (absx - rounded) >= 0.5
+    return np.copysign(rounded, x)
 
-parser = SpecParser()
+def catalog_files():
+    # The catalogue files as found; main.dat and photo.dat may be compressed
+    return tuple(find_datafile(name) for name in CATALOG_FILES)
 
-packed_stars = []
+def read_catalog(outdir=None, chunk_rows=None):
+    readme_file, main_file, photo_file = catalog_files()
+    readme = ReadMe(readme_file)
+    maindata = CdsTable(main_file, readme, COLUMNS)
+    photdata = CdsTable(photo_file, readme, COLUMNS)
 
-for i in range(len(alldata)):
-    if not alldata['SpType'].mask[i]:
-        sptype = CelestiaSpectrum.create(parser.parse(alldata['SpType'][i]))
-    else:
-        sptype = CelestiaSpectrum()
-    
-    RArad = radians(alldata['RAdeg'][i])
-    DErad = radians(alldata['DEdeg'][i])
-    
-    if alldata['Vmag'].mask[i]:
-        skipped += 1
-        continue
-    
-    if not alldata['Dist'].mask[i]:
-        used_dist += 1
-        distance = alldata['Dist'][i]
-    elif alldata['e_Plx'][i] < alldata['Plx'][i]:
-        used_plx += 1
-        distance = 1000 / alldata['Plx'][i]
+    if outdir is None:
+        return join(maindata, photdata, key='HIP', columns=COLUMNS)
+    return join(maindata, photdata, key='HIP', columns=COLUMNS,
+                outdir=outdir, chunk_rows=chunk_rows)
+
+def load_catalog(chunk_rows=None, report=None):
+    if report is None:
+        report = BuildReport()
+
+    with report.stage('checkpoint') as stage:
+        data = load_checkpoint(CHECKPOINT_DIR, catalog_files(), COLUMNS)
+        if data is not None:
+            stage['rows'] = len(data['HIP'])
+    report.count('checkpoint_loaded', data is not None)
+    if data is not None:
+        print("Loaded catalogue from", CHECKPOINT_DIR)
+        return data
+
+    # the text columns are decoded as the join gathers them, so reading
+    # and joining are timed together
+    if chunk_rows is None:
+        with report.stage('read_join') as stage:
+            data = read_catalog()
+            stage['rows'] = len(data['HIP'])
+        with report.stage('save_checkpoint', len(data['HIP'])):
+            save_checkpoint(CHECKPOINT_DIR, catalog_files(), COLUMNS,
+                            data)
     else:
-        skipped += 1
-        continue
-    
-    absmag = alldata['Vmag'][i] - 5*(log10(distance)-1)
-    
-    distance *= LY_PER_PC
-    
-    vector = np.matrix((
-        (distance*cos(RArad)*cos(DErad),),
-        (distance*sin(DErad),),
-        (-distance*sin(RArad)*cos(DErad),)
-    ))
-    
-    ecliptic = ROTMATRIX*vector
-    
-    packed_stars.append(struct.pack('<l3fhH',
-                                    alldata['HIP'][i],
-                                    ecliptic.item(0),
-                                    ecliptic.item(1),
-                                    ecliptic.item(2),
-                                    int(round(absmag*256)),
-                                    sptype.code))
-
-print("Found", len(packed_stars))
-print("Used dist for", used_dist)
-print("Used plx for", used_plx)
-print("Skipped", skipped)
-
-with open('stars.dat', 'wb') as f:
-    f.write(struct.pack('<8sHL', 'CELSTARS', 0x0100, len(packed_stars)))
-    for packed_star in packed_stars:
-        f.write(packed_star)
\ No newline at end of file
+        # join straight into the checkpoint files
+        with report.stage('read_join') as stage:
+            invalidate_checkpoint(CHECKPOINT_DIR)
+            data = read_catalog(CHECKPOINT_DIR, chunk_rows)
+            write_manifest(CHECKPOINT_DIR, catalog_files(), COLUMNS)
+            stage['rows'] = len(data['HIP'])
+    return data
+
+def crossmatch_catalog(data, filename, radius=MATCH_RADIUS):
+    # The second catalogue is described by the ReadMe in its own directory
+    readme = ReadMe(os.path.join(os.path.dirname(filename), 'ReadMe'))
+    return merge(data, CdsTable(filename, readme, COLUMNS), key='HIP',
+                 columns=COLUMNS, radius=radius)
+
+def catalog_chunks(chunk_rows=STREAM_ROWS):
+    # Yields the joined catalogue chunk_rows rows at a time, from the
+    # checkpoint if it is up to date, otherwise from the catalogue files
+    data = load_checkpoint(CHECKPOINT_DIR, catalog_files(), COLUMNS)
+    if data is not None:
+        print("Streaming catalogue from", CHECKPOINT_DIR)
+        for start in range(0, len(data['HIP']), chunk_rows):
+            yield dict((name, data[name][start:start+chunk_rows])
+                       for name in COLUMNS)
+        return
+
+    readme_file, main_file, photo_file = catalog_files()
+    readme = ReadMe(readme_file)
+    for data in join_chunks(CdsTable(main_file, readme, COLUMNS),
+                            CdsTable(photo_file, readme, COLUMNS),
+                            key='HIP', columns=COLUMNS,
+                            chunk_rows=chunk_rows):
+        yield data
+
+def select_distances(data):
+    has_vmag = ~_mask(data['Vmag'])
+    has_dist = has_vmag & ~_mask(data['Dist'])
+    plx = _values(data['Plx'])
+    has_plx = (has_vmag & ~has_dist &
+               ~_mask(data['Plx']) & ~_mask(data['e_Plx']))
+    has_plx[has_plx] = _values(data['e_Plx'])[has_plx] < plx[has_plx]
+
+    distance = np.zeros(len(has_vmag))
+    distance[has_dist] = _values(data['Dist'])[has_dist]
+    distance[has_plx] = 1000 / plx[has_plx]
+
+    return has_dist, has_plx, distance
+
+def ecliptic_positions(RAdeg, DEdeg, distance):
+    RArad = radians(RAdeg)
+    DErad = radians(DEdeg)
+
+    vector = (
+        distance*cos(RArad)*cos(DErad),
+        distance*sin(DErad),
+        -distance*sin(RArad)*cos(DErad)
+    )
+
+    return [ROTMATRIX[row,0]*vector[0] +
+            ROTMATRIX[row,1]*vector[1] +
+            ROTMATRIX[row,2]*vector[2] for row in range(3)]
+
+def spectral_codes(sptypes, cache, pool=None):
+    codes = np.full(len(sptypes), CelestiaSpectrum().code, dtype='<u2')
+    has_sptype = ~_mask(sptypes)
+    unique, inverse = np.unique(_values(sptypes)[has_sptype],
+                                return_inverse=True)
+    codes[has_sptype] = cache.classify_many(unique, pool)[0][inverse]
+    return codes
+
+def build_stars(data, cache, pool=None, report=None):
+    if report is None:
+        report = BuildReport()
+
+    with report.stage('select', len(data['HIP'])):
+        has_dist, has_plx, distance = select_distances(data)
+        used = np.flatnonzero(has_dist | has_plx)
+        distance = distance[used]
+
+    with report.stage('positions', len(used)):
+        absmag = _values(data['Vmag'])[used] - 5*(log10(distance)-1)
+
+        distance *= LY_PER_PC
+
+        stars = np.empty(len(used), dtype=STAR_DTYPE)
+        stars['hip'] = _values(data['HIP'])[used]
+        stars['x'], stars['y'], stars['z'] = ecliptic_positions(
+            _values(data['RAdeg'])[used], _values(data['DEdeg'])[used],
+            distance)
+        stars['absmag'] = _round(absmag*256)
+
+    with report.stage('classify', len(used)):
+        stars['sptype'] = spectral_codes(data['SpType'][used], cache, pool)
+
+    status = np.full(len(has_dist), SKIPPED, dtype=np.int8)
+    status[has_dist] = USED_DIST
+    status[has_plx] = USED_PLX
+    return stars, status
+
+def build_fingerprint():
+    return source_fingerprint(sys.modules[__name__], speccache, specinfo,
+                              specparse)
+
+def read_stars(filename, count):
+    try:
+        stars = open_stars(filename)
+    except (IOError, ValueError):
+        return None
+    if len(stars) != count:
+        return None
+    return stars
+
+def build_incremental(data, cache, pool, manifest, report=None):
+    # Rebuild only the rows whose inputs changed since the manifest was
+    # written, reusing the other records from the existing stars.dat
+    if report is None:
+        report = BuildReport()
+
+    hip = _values(data['HIP'])
+    count = len(hip)
+    with report.stage('hash', count):
+        hashes = row_hashes(data, COLUMNS)
+
+    old_stars = None
+    if manifest is not None and len(np.unique(hip)) == count:
+        old_stars = read_stars(STARS_FILE,
+                               np.count_nonzero(manifest['record'] >= 0))
+
+    if old_stars is None:
+        stars, status = build_stars(data, cache, pool, report)
+        return stars, status, hashes, count
+
+    rows, old_rows = join_indices(hip, manifest['hip'])
+    same = manifest['hash'][old_rows] == hashes[rows]
+    rows, old_rows = rows[same], old_rows[same]
+    changed = np.ones(count, dtype=bool)
+    changed[rows] = False
+    changed = np.flatnonzero(changed)
+
+    new_stars, new_status = build_stars(
+        dict((name, data[name][changed]) for name in COLUMNS), cache, pool,
+        report)
+
+    status = np.empty(count, dtype=np.int8)
+    status[rows] = manifest['status'][old_rows]
+    status[changed] = new_status
+
+    position = np.cumsum(status != SKIPPED) - 1
+    stars = np.empty(np.count_nonzero(status != SKIPPED), dtype=STAR_DTYPE)
+    kept = status[rows] != SKIPPED
+    stars[position[rows[kept]]] = old_stars[manifest['record'][old_rows[kept]]]
+    stars[position[changed[new_status != SKIPPED]]] = new_stars
+    return stars, status, hashes, len(changed)
+
+def star_blocks(stars, data, status, block_rows=BLOCK_ROWS):
+    # Yields (stars, extra) pairs of at most block_rows records
+    used = np.flatnonzero(status != SKIPPED)
+    distance = select_distances(data)[2]
+    for start in range(0, len(stars), block_rows):
+        rows = used[start:start+block_rows]
+        extra = np.empty(len(rows), dtype=EXTRA_DTYPE)
+        extra['ra'] = _values(data['RAdeg'])[rows]
+        extra['dec'] = _values(data['DEdeg'])[rows]
+        extra['distance'] = distance[rows] * LY_PER_PC
+        extra['appmag'] = _values(data['Vmag'])[rows]
+        yield stars[start:start+block_rows], extra
+
+def built_chunks(chunks, cache, pool=None):
+    # Selects, transforms and classifies each chunk of catalogue rows,
+    # yielding (data, stars, status)
+    for data in chunks:
+        stars, status = build_stars(data, cache, pool)
+        yield data, stars, status
+
+def streamed_blocks(built, rows):
+    # Packs each built chunk into blocks for the sinks.  The per-row
+    # values the manifest and report need are appended to rows as
+    # (hip, hashes, status, used rows without a spectral type).
+    for data, stars, status in built:
+        rows.append((np.array(_values(data['HIP'])),
+                     row_hashes(data, COLUMNS), status,
+                     np.count_nonzero(_mask(data['SpType'])[status != SKIPPED])))
+        for block in star_blocks(stars, data, status):
+            yield block
+
+def stream_build(sinks, cache, pool=None, chunk_rows=STREAM_ROWS):
+    # Reads, builds and writes the catalogue one chunk at a time.  Returns
+    # the HIP numbers, row hashes and status of every row and the number
+    # of stars without a spectral type.
+    rows = []
+    write_outputs(sinks, streamed_blocks(
+        built_chunks(catalog_chunks(chunk_rows), cache, pool), rows))
+    if not rows:
+        return (np.empty(0, dtype=np.int64), np.empty(0, dtype=np.uint64),
+                np.empty(0, dtype=np.int8), 0)
+    return (np.concatenate([chunk[0] for chunk in rows]),
+            np.concatenate([chunk[1] for chunk in rows]),
+            np.concatenate([chunk[2] for chunk in rows]),
+            sum(chunk[3] for chunk in rows))
+
+def replace_file(tmpname, filename):
+    # rename replaces the target atomically on POSIX; Windows refuses to
+    # rename over an existing file, so there it is removed first
+    try:
+        os.rename(tmpname, filename)
+    except OSError:
+        if not os.path.exists(filename):
+            raise
+        os.remove(filename)
+        os.rename(tmpname, filename)
+
+class StarSink(object):
+    # Receives the output records block by block; count is the total
+    # number of records that will be written, or None if it is only known
+    # once the last block has been written.  The output is written to
+    # partname and only replaces filename when the sink is closed.
+    def __init__(self, filename, count=None):
+        self.filename = filename
+        self.count = count
+        self.written = 0
+        self.f = None
+        self.partname = filename + '.tmp'
+        # where the records go while the count they must be preceded by
+        # is not yet known
+        self.spoolname = None
+        self.names = {}
+
+    def spectra(self, codes):
+        # Spectral type names for an array of Celestia codes, for the
+        # text outputs
+        for code in np.unique(codes):
+            if code not in self.names:
+                self.names[code] = str(CelestiaSpectrum(code=int(code)))
+        return [self.names[code] for code in codes]
+
+    def write(self, stars, extra):
+        raise NotImplementedError
+
+    def _header(self, f):
+        # writes what precedes the spooled records, once they are counted
+        raise NotImplementedError
+
+    def close(self):
+        if self.f is not None:
+            self.f.close()
+        if self.spoolname is not None:
+            with open(self.partname, 'wb') as f, \
+                    open(self.spoolname, 'rb') as spool:
+                self._header(f)
+                shutil.copyfileobj(spool, f, WRITE_BUFFER)
+            os.remove(self.spoolname)
+        replace_file(self.partname, self.filename)
+
+    def abort(self):
+        # Called instead of close if the build fails part way.  The
+        # partly written files are removed and any previous output is
+        # left in place.
+        if self.f is not None:
+            self.f.close()
+        for name in (self.partname, self.spoolname):
+            if name is not None and os.path.exists(name):
+                os.remove(name)
+#end class StarSink
+
+class BinarySink(StarSink):
+    def __init__(self, filename, count=None):
+        StarSink.__init__(self, filename, count)
+        self.f = open(self.partname, 'wb', WRITE_BUFFER)
+        self.f.write(struct.pack(HEADER_FORMAT, MAGIC, VERSION, count or 0))
+
+    def write(self, stars, extra):
+        self.f.write(np.asarray(stars, dtype=STAR_DTYPE).tobytes())
+        self.written += len(stars)
+
+    def close(self):
+        if self.count is None:
+            # patch the record count into the header
+            self.f.seek(0)
+            self.f.write(struct.pack(HEADER_FORMAT, MAGIC, VERSION,
+                                     self.written))
+        StarSink.close(self)
+#end class BinarySink
+
+class TextSink(StarSink):
+    # The text format read by Celestia's makestardb: the star count, then
+    # one line per star of HIP, RA, Dec, distance (ly), V and spectral type
+    def __init__(self, filename, count=None):
+        StarSink.__init__(self, filename, count)
+        if count is None:
+            # the lines are spooled until the count, which comes first, is
+            # known
+            self.spoolname = filename + '.spool'
+            self.f = open(self.spoolname, 'wb', WRITE_BUFFER)
+        else:
+            self.f = open(self.partname, 'wb', WRITE_BUFFER)
+            self.f.write(('%d\n' % count).encode('ascii'))
+
+    def write(self, stars, extra):
+        lines = ['%d %.6f %.6f %.4f %.3f %s\n' % row for row in
+                 zip(stars['hip'], extra['ra'], extra['dec'],
+                     extra['distance'], extra['appmag'],
+                     self.spectra(stars['sptype']))]
+        self.f.write(''.join(lines).encode('ascii'))
+        self.written += len(stars)
+
+    def _header(self, f):
+        f.write(('%d\n' % self.written).encode('ascii'))
+#end class TextSink
+
+class CsvSink(StarSink):
+    HEADER = 'hip,ra,dec,distance,appmag,absmag,x,y,z,sptype,spectrum\n'
+
+    def __init__(self, filename, count=None):
+        StarSink.__init__(self, filename, count)
+        self.f = open(self.partname, 'wb', WRITE_BUFFER)
+        self.f.write(CsvSink.HEADER.encode('ascii'))
+
+    def write(self, stars, extra):
+        lines = ['%d,%.6f,%.6f,%.4f,%.3f,%.4f,%.6g,%.6g,%.6g,%d,%s\n' % row
+                 for row in zip(stars['hip'], extra['ra'], extra['dec'],
+                                extra['distance'], extra['appmag'],
+                                absolute_magnitudes(stars), stars['x'],
+                                stars['y'], stars['z'], stars['sptype'],
+                                self.spectra(stars['sptype']))]
+        self.f.write(''.join(lines).encode('ascii'))
+        self.written += len(stars)
+#end class CsvSink
+
+class NpySink(StarSink):
+    # A structured .npy array holding the star records and EXTRA_DTYPE
+    def __init__(self, filename, count=None):
+        StarSink.__init__(self, filename, count)
+        self.dtype = np.dtype(STAR_DTYPE.descr + EXTRA_DTYPE.descr)
+        self.array = None
+        if count is None:
+            # the array data is spooled until the shape for the header is
+            # known
+            self.spoolname = filename + '.spool'
+            self.f = open(self.spoolname, 'wb', WRITE_BUFFER)
+        else:
+            self.array = np.lib.format.open_memmap(self.partname, mode='w+',
+                                                   dtype=self.dtype,
+                                                   shape=(count,))
+
+    def write(self, stars, extra):
+        if self.array is None:
+            block = np.empty(len(stars), dtype=self.dtype)
+        else:
+            block = self.array[self.written:self.written+len(stars)]
+        for name in STAR_DTYPE.names:
+            block[name] = stars[name]
+        for name in EXTRA_DTYPE.names:
+            block[name] = extra[name]
+        if self.array is None:
+            self.f.write(block.tobytes())
+        self.written += len(stars)
+
+    def _header(self, f):
+        np.lib.format.write_array_header_1_0(f, {
+            'descr': np.lib.format.dtype_to_descr(self.dtype),
+            'fortran_order': False,
+            'shape': (self.written,),
+        })
+
+    def close(self):
+        if self.array is not None:
+            self.array.flush()
+            # the mapping is released before the file is renamed
+            self.array = None
+        StarSink.close(self)
+
+    def abort(self):
+        self.array = None
+        StarSink.abort(self)
+#end class NpySink
+
+def write_outputs(sinks, blocks):
+    # A single pass over the records feeds every sink.  The outputs are
+    # only completed once every block has been written; if reading or
+    # building a block fails, or the build is interrupted, they are
+    # abandoned instead.
+    try:
+        for stars, extra in blocks:
+            for sink in sinks:
+                sink.write(stars, extra)
+    except BaseException:
+        for sink in sinks:
+            sink.abort()
+        raise
+    for sink in sinks:
+        sink.close()
+
+def main():
+    argparser = argparse.ArgumentParser(
+        description='Build a Celestia stars.dat from the XHIP catalogue.')
+    argparser.add_argument('--chunk-rows', type=int, default=None,
+                           help='join the catalogue files out of core, '
+                                'this many rows at a time')
+    argparser.add_argument('--stream', action='store_true',
+                           help='read, build and write the catalogue in '
+                                'chunks of --chunk-rows rows (default %d), '
+                                'so memory use does not grow with its '
+                                'size' % STREAM_ROWS)
+    argparser.add_argument('-j', '--jobs', type=int, default=1,
+                           help='number of processes used to classify '
+                                'spectral types')
+    argparser.add_argument('-i', '--incremental', action='store_true',
+                           help='only reprocess rows changed since the '
+                                'last build')
+    argparser.add_argument('--index', action='store_true',
+                           help='also write a HIP to record index')
+    argparser.add_argument('--octree', action='store_true',
+                           help='also write a spatial octree over the stars')
+    argparser.add_argument('--crossmatch', metavar='FILE',
+                           help='fill in missing values from, and add the '
+                                'unmatched stars of, a second catalogue '
+                                'matched by position')
+    argparser.add_argument('--match-radius', type=float,
+                           default=MATCH_RADIUS,
+                           help='cross-match radius in arcsec (default '
+                                '%g)' % MATCH_RADIUS)
+    argparser.add_argument('--report', metavar='FILE',
+                           help='write stage timings and counters to FILE '
+                                'as JSON')
+    argparser.add_argument('--text', action='store_true',
+                           help='also write %s' % STARS_TEXT_FILE)
+    argparser.add_argument('--csv', action='store_true',
+                           help='also write the records and catalogue '
+                                'values to %s' % SIDECAR_CSV_FILE)
+    argparser.add_argument('--npy', action='store_true',
+                           help='also write the records and catalogue '
+                                'values to %s' % SIDECAR_NPY_FILE)
+    args = argparser.parse_args()
+    if args.stream and (args.incremental or args.crossmatch):
+        argparser.error('--stream cannot be combined with --incremental '
+                        'or --crossmatch')
+
+    report = BuildReport()
+    alldata = None
+    if not args.stream:
+        alldata = load_catalog(args.chunk_rows, report)
+    if args.crossmatch:
+        with report.stage('crossmatch') as stage:
+            alldata, matched, appended = crossmatch_catalog(
+                alldata, args.crossmatch, args.match_radius)
+            stage['rows'] = len(alldata['HIP'])
+        print("Cross-matched", len(matched), "stars with", args.crossmatch +
+              ", added", len(appended))
+        report.count('crossmatched', len(matched))
+        report.count('crossmatch_added', len(appended))
+
+    cache = SpecCache()
+    with report.stage('load_cache'):
+        cached = cache.load(SPEC_CACHE_FILE)
+
+    fingerprint = build_fingerprint()
+    manifest = None
+    if args.incremental:
+        with report.stage('load_manifest'):
+            manifest = load_manifest(MANIFEST_FILE, fingerprint)
+
+    sinks = [(BinarySink, STARS_FILE, True),
+             (TextSink, STARS_TEXT_FILE, args.text),
+             (CsvSink, SIDECAR_CSV_FILE, args.csv),
+             (NpySink, SIDECAR_NPY_FILE, args.npy)]
+    # one set of worker processes classifies every chunk of the build
+    pool = worker_pool(args.jobs)
+    try:
+        if args.stream:
+            # classification, positions and output all happen chunk by
+            # chunk, so they are timed as a single stage
+            with report.stage('stream') as stage:
+                hip, hashes, status, missing_sptype = stream_build(
+                    [sink(filename) for sink, filename, enabled in sinks
+                     if enabled],
+                    cache, pool, args.chunk_rows or STREAM_ROWS)
+                stage['rows'] = len(status)
+            stars = open_stars(STARS_FILE)
+            processed = len(status)
+        else:
+            stars, status, hashes, processed = build_incremental(
+                alldata, cache, pool, manifest, report)
+            hip = _values(alldata['HIP'])
+            missing_sptype = np.count_nonzero(
+                _mask(alldata['SpType'])[status != SKIPPED])
+    finally:
+        if pool is not None:
+            pool.close()
+            pool.join()
+
+    print("Found", len(stars))
+    print("Used dist for", np.count_nonzero(status == USED_DIST))
+    print("Used plx for", np.count_nonzero(status == USED_PLX))
+    print("Skipped", np.count_nonzero(status == SKIPPED))
+    if args.incremental:
+        print("Reprocessed", processed, "of", len(status), "rows")
+    # each distinct SpType string is classified once, so the cache counters
+    # are of unique strings rather than rows
+    print("Parsed", cache.misses, "unique spectral types, cache hits",
+          cache.hits, "(%d loaded from %s)" % (cached, SPEC_CACHE_FILE))
+    print("Fast path for", cache.fast_parses, "full parse for",
+          cache.full_parses, "unique spectral types")
+
+    records = np.where(status != SKIPPED,
+                       np.cumsum(status != SKIPPED) - 1, -1)
+    if not args.stream:
+        with report.stage('write', len(stars)):
+            write_outputs([sink(filename, len(stars))
+                           for sink, filename, enabled in sinks if enabled],
+                          star_blocks(stars, alldata, status))
+    if args.index:
+        with report.stage('index', len(stars)):
+            write_index(STARS_FILE + INDEX_SUFFIX, stars['hip'])
+    elif os.path.exists(STARS_FILE + INDEX_SUFFIX):
+        # the index of the previous stars.dat
+        os.remove(STARS_FILE + INDEX_SUFFIX)
+    if args.octree:
+        with report.stage('octree', len(stars)):
+            write_octree(STARS_FILE + OCTREE_SUFFIX, stars)
+    elif os.path.exists(STARS_FILE + OCTREE_SUFFIX):
+        os.remove(STARS_FILE + OCTREE_SUFFIX)
+    with report.stage('save_manifest', len(status)):
+        save_manifest(MANIFEST_FILE, fingerprint, hip, hashes, status,
+                      records)
+    with report.stage('save_cache'):
+        cache.save(SPEC_CACHE_FILE)
+
+    if args.report:
+        report.count('rows', len(status))
+        report.count('stars', len(stars))
+        report.count('used_dist', np.count_nonzero(status == USED_DIST))
+        report.count('used_plx', np.count_nonzero(status == USED_PLX))
+        report.count('skipped', np.count_nonzero(status == SKIPPED))
+        report.count('reprocessed', processed)
+        report.count('missing_sptype', missing_sptype)
+        report.count('default_sptype_code', np.count_nonzero(
+            stars['sptype'] == CelestiaSpectrum().code))
+        for name in ('hits', 'misses', 'fast_parses', 'full_parses',
+                     'parse_errors', 'parse_failures'):
+            report.count('unique_sptype_' + name, getattr(cache, name))
+        report.count('unique_sptype_cache_loaded', cached)
+        report.write(args.report)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,428 @@
+#!/usr/bin/python
+#
+# cdsread.py: Decode CDS fixed-width tables described by a ReadMe
+# Copyright (C) 2016  Andrew Tribick
+#
+# This program is free software; you can redistribute it and/or
+# modify it under the terms of the GNU General Public License
+# as published by the Free Software Foundation; either version 2
+# of the License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston,
+# MA  02110-1301, USA.
+
+from __future__ import print_function
+from __future__ import division
+
+import bz2
+import fnmatch
+import gzip
+import os
+import re
+import threading
+from collections import OrderedDict
+
+try:
+    import queue
+except ImportError:
+    import Queue as queue
+
+try:
+    import lzma
+except ImportError:
+    # Python 2 without backports.lzma; .xz files can't be read
+    lzma = None
+
+import numpy as np
+
+RE_DESCRIPTION = re.compile(r'Byte-by-byte Description of file: (?P<name>.+)$',
+                            re.IGNORECASE)
+
+RE_COLUMN = re.compile(r"""\s*
+                           (?P<start> \d+ \s* -)? \s*
+                           (?P<end>   \d+)        \s+
+                           (?P<format> [AIFE]\d+(\.\d+)?) \s+
+                           (?P<units> \S+)        \s+
+                           (?P<name>  \S+)
+                           (\s+ (?P<descr> \S.*))?""",
+                       re.VERBOSE)
+
+RE_NULL = re.compile(r'\? (?P<equal> =)? (?P<nullval> \S*)', re.VERBOSE)
+
+RE_SUMMARY = re.compile(r'(?P<name>\S+)\s+(?P<lrecl>\d+)\s')
+
+# Data files may be compressed in any of these forms, shown by the suffix
+COMPRESSED_SUFFIXES = ('.gz', '.bz2', '.xz')
+
+# Compressed files are decompressed in blocks of this size, at most
+# READ_AHEAD blocks ahead of the records being decoded
+READ_BLOCK = 1 << 20
+READ_AHEAD = 16
+
+def table_name(datafile):
+    # The name the ReadMe uses for a data file, which may be compressed
+    name = os.path.basename(datafile)
+    for suffix in COMPRESSED_SUFFIXES:
+        if name.endswith(suffix):
+            return name[:-len(suffix)]
+    return name
+
+def find_datafile(datafile):
+    # The data file itself if present, otherwise a compressed copy
+    if not os.path.exists(datafile):
+        for suffix in COMPRESSED_SUFFIXES:
+            if os.path.exists(datafile + suffix):
+                return datafile + suffix
+    return datafile
+
+def open_compressed(datafile):
+    # A binary file object giving the decompressed contents, or None if
+    # the file isn't compressed
+    if datafile.endswith('.gz'):
+        return gzip.open(datafile, 'rb')
+    elif datafile.endswith('.bz2'):
+        return bz2.BZ2File(datafile, 'rb')
+    elif datafile.endswith('.xz'):
+        if lzma is None:
+            raise IOError("Can't read %s: the lzma module is not available" %
+                          datafile)
+        return lzma.open(datafile, 'rb')
+    return None
+
+class CdsColumn(object):
+    def __init__(self, name, start, end, fmt, null=None):
+        self.name = name
+        self.start = start
+        self.end = end
+        self.format = fmt
+        self.null = null
+
+    @property
+    def width(self):
+        return self.end - self.start
+
+    @property
+    def kind(self):
+        return self.format[0]
+
+    def __repr__(self):
+        return 'CdsColumn(%r, %d, %d, %r)' % (self.name, self.start, self.end,
+                                             self.format)
+#end class CdsColumn
+
+class ReadMe(object):
+    def __init__(self, filename):
+        self.filename = filename
+        self.lrecl = {}
+        self.sections = []
+
+        with open(filename, 'r') as f:
+            lines = [line.strip() for line in f]
+
+        in_summary = False
+        i = 0
+        while i < len(lines):
+            line = lines[i]
+            match = RE_DESCRIPTION.match(line)
+            if match:
+                names = [s for s in re.split('[, ]+', match.group('name')) if s]
+                columns, i = self._read_columns(lines, i+1)
+                self.sections.append((names, columns))
+                continue
+
+            if line.startswith('File Summary'):
+                in_summary = True
+            elif in_summary and line.startswith('='):
+                in_summary = False
+            elif in_summary:
+                match = RE_SUMMARY.match(line)
+                if match:
+                    self.lrecl[match.group('name')] = int(match.group('lrecl'))
+            i += 1
+
+    @staticmethod
+    def _read_columns(lines, i):
+        # skip the rules and the "Bytes Format Units Label" heading
+        separators = 0
+        while i < len(lines) and separators < 2:
+            if lines[i].startswith(('------', '=======')):
+                separators += 1
+            i += 1
+
+        columns = []
+        while i < len(lines) and not lines[i].startswith(('------', '=======')):
+            match = RE_COLUMN.match(lines[i])
+            if match:
+                start = int(re.sub(r'[-\s]', '',
+                                   match.group('start') or match.group('end')))
+                null = None
+                nullmatch = RE_NULL.match(match.group('descr') or '')
+                if nullmatch:
+                    null = nullmatch.group('nullval')
+                columns.append(CdsColumn(match.group('name'), start-1,
+                                         int(match.group('end')),
+                                         match.group('format'), null))
+            i += 1
+        return columns, i
+
+    def columns(self, datafile):
+        name = table_name(datafile)
+        for names, columns in self.sections:
+            if any(fnmatch.fnmatch(name, pattern) for pattern in names):
+                return columns
+        raise ValueError("Can't find table %s in %s" % (name, self.filename))
+
+    def record_length(self, datafile):
+        name = table_name(datafile)
+        lrecl = max(c.end for c in self.columns(datafile))
+        return max(lrecl, self.lrecl.get(name, 0))
+#end class ReadMe
+
+def record_dtype(columns, itemsize):
+    return np.dtype(dict(names=[c.name for c in columns],
+                         formats=['S%d' % c.width for c in columns],
+                         offsets=[c.start for c in columns],
+                         itemsize=itemsize))
+
+class BackgroundReader(object):
+    # Reads a file object in blocks on a separate thread, so that reading
+    # and decompressing the next blocks overlaps with the work done on the
+    # current one.  zlib, bz2 and lzma release the GIL while decompressing.
+    def __init__(self, f, block_size=READ_BLOCK, read_ahead=READ_AHEAD):
+        self.f = f
+        self.block_size = block_size
+        self.queue = queue.Queue(read_ahead)
+        self.thread = threading.Thread(target=self._run)
+        self.thread.daemon = True
+        self.thread.start()
+
+    def _run(self):
+        try:
+            while True:
+                block = self.f.read(self.block_size)
+                self.queue.put(block)
+                if not block:
+                    break
+        except Exception as e:
+            # raised again in the reading thread
+            self.queue.put(e)
+        finally:
+            self.f.close()
+
+    def blocks(self):
+        while True:
+            block = self.queue.get()
+            if isinstance(block, Exception):
+                raise block
+            if not block:
+                break
+            yield block
+        self.thread.join()
+#end class BackgroundReader
+
+def _pad_lines(data, lrecl):
+    # Copies the lines of data, without their line ends, into records of
+    # lrecl characters and a newline; longer lines are truncated
+    ends = np.flatnonzero(data == ord('\n'))
+    if (np.array_equal(ends, np.arange(lrecl, len(data), lrecl + 1)) and
+            not (data[ends - 1] == ord('\r')).any()):
+        # already padded
+        return data.copy()
+    starts = np.empty(len(ends), dtype=np.int64)
+    starts[:1] = 0
+    starts[1:] = ends[:-1] + 1
+    lengths = ends - starts
+    while True:
+        # as rstrip, every carriage return before the newline goes
+        cr = (lengths > 0) & (data[np.maximum(starts + lengths - 1, 0)] ==
+                              ord('\r'))
+        if not cr.any():
+            break
+        lengths[cr] -= 1
+    lengths = np.minimum(lengths, lrecl)
+
+    records = np.full((len(ends), lrecl + 1), ord(' '), dtype=np.uint8)
+    records[:, lrecl] = ord('\n')
+    offsets = np.arange(lrecl)
+    inline = offsets < lengths[:, np.newaxis]
+    records[:, :lrecl][inline] = data[(starts[:, np.newaxis] +
+                                       offsets)[inline]]
+    return records.ravel()
+
+def _split_records(blocks, lrecl):
+    # Pads the lines of a sequence of data blocks into fixed-length
+    # records, yielding them block by block.  A line split between blocks
+    # is carried over to the next one.
+    tail = b''
+    for block in blocks:
+        data = tail + block
+        end = data.rfind(b'\n') + 1
+        if end:
+            yield _pad_lines(np.frombuffer(data[:end], dtype=np.uint8), lrecl)
+        tail = data[end:]
+    if tail:
+        yield _pad_lines(np.frombuffer(tail + b'\n', dtype=np.uint8), lrecl)
+
+def _mapped_records(datafile, lrecl):
+    # Memory-maps the file if every line is padded to the same length.
+    # Returns (records, record length with line end), or None.
+    if open_compressed(datafile) is not None:
+        return None
+    size = os.path.getsize(datafile)
+    for newline in (1, 2):
+        reclen = lrecl + newline
+        if size == 0 or size % reclen:
+            continue
+        raw = np.memmap(datafile, dtype=np.uint8, mode='r')
+        ends = raw[reclen-1::reclen]
+        if (ends == ord('\n')).all():
+            return raw, reclen
+    return None
+
+def _file_blocks(datafile):
+    # The contents of the file in blocks.  Compressed files are
+    # decompressed on a background thread while earlier blocks are used.
+    compressed = open_compressed(datafile)
+    if compressed is not None:
+        for block in BackgroundReader(compressed).blocks():
+            yield block
+        return
+    with open(datafile, 'rb') as f:
+        for block in iter(lambda: f.read(READ_BLOCK), b''):
+            yield block
+
+def _field_bytes(raw, reclen, column):
+    count = len(raw) // reclen
+    return np.ndarray(shape=(count, column.width), dtype=np.uint8,
+                      buffer=raw, offset=column.start,
+                      strides=(reclen, 1))
+
+def _decode(chars, column):
+    mask = (chars == ord(' ')).all(axis=1)
+
+    values = np.ascontiguousarray(chars).view('S%d' % column.width).ravel()
+    if column.null:
+        stripped = np.char.strip(values)
+        if column.null == '-':
+            for i in range(1, 5):
+                mask |= stripped == b'-'*i
+        else:
+            mask |= stripped == column.null.encode('ascii')
+
+    if column.kind == 'A':
+        values = np.char.strip(values)
+    else:
+        values = values.copy()
+        values[mask] = b'0'
+        if column.kind == 'I':
+            values = values.astype(np.int64)
+        else:
+            values = values.astype(np.float64)
+
+    return np.ma.MaskedArray(values, mask=mask)
+
+def _append(buffers, name, values, count):
+    # Copies a block of decoded values into the growing arrays for the
+    # column at row count.  The arrays are resized in place, so capacity
+    # not yet used is never touched.
+    data, mask = buffers.get(name, (None, None))
+    rows = len(values)
+    if data is None:
+        data = np.empty(rows, dtype=values.dtype)
+        mask = np.empty(rows, dtype=np.bool_)
+    elif values.dtype.itemsize > data.dtype.itemsize:
+        # a wider string than any so far
+        wider = np.empty(len(data), dtype=values.dtype)
+        wider[:count] = data[:count]
+        data = wider
+    if count + rows > len(data):
+        size = max(count + rows, 2*len(data))
+        data.resize(size, refcheck=False)
+        mask.resize(size, refcheck=False)
+    data[count:count+rows] = np.ma.getdata(values)
+    mask[count:count+rows] = np.ma.getmaskarray(values)
+    buffers[name] = (data, mask)
+
+def _decode_blocks(datafile, lrecl, columns):
+    # Decodes the columns of a file that can't be memory-mapped block by
+    # block, as the lines are read, so that only the decoded columns are
+    # held in memory.  Returns (row count, dict of masked columns).
+    reclen = lrecl + 1
+    count = 0
+    buffers = {}
+    for raw in _split_records(_file_blocks(datafile), lrecl):
+        for column in columns:
+            _append(buffers, column.name,
+                    _decode(_field_bytes(raw, reclen, column), column), count)
+        count += len(raw) // reclen
+
+    data = OrderedDict()
+    for column in columns:
+        if column.name not in buffers:
+            data[column.name] = _decode(np.zeros((0, column.width),
+                                                 dtype=np.uint8), column)
+            continue
+        values, mask = buffers.pop(column.name)
+        values.resize(count, refcheck=False)
+        mask.resize(count, refcheck=False)
+        data[column.name] = np.ma.MaskedArray(values, mask=mask)
+    return count, data
+
+class CdsTable(object):
+    # columns, if given, limits the table to those of its columns that the
+    # caller will use.  Files that can be memory-mapped are decoded a
+    # column at a time when asked; for other files, compressed ones
+    # included, those columns are decoded as the file is read.
+    def __init__(self, datafile, readme='ReadMe', columns=None):
+        if not isinstance(readme, ReadMe):
+            readme = ReadMe(readme)
+        self.datafile = datafile
+        self.columns = OrderedDict((c.name, c) for c in readme.columns(datafile)
+                                   if columns is None or c.name in columns)
+        lrecl = readme.record_length(datafile)
+        self.data = None
+        mapped = _mapped_records(datafile, lrecl)
+        if mapped is not None:
+            self.raw, self.reclen = mapped
+            self.count = len(self.raw) // self.reclen
+        else:
+            self.count, self.data = _decode_blocks(datafile, lrecl,
+                                                   list(self.columns.values()))
+
+    def __len__(self):
+        return self.count
+
+    def __contains__(self, name):
+        return name in self.columns
+
+    def __getitem__(self, name):
+        return self.column(name)
+
+    def keys(self):
+        return list(self.columns.keys())
+
+    def column(self, name, rows=None):
+        # rows may be a slice or an index array; only those rows are decoded
+        if self.data is not None:
+            values = self.data[name]
+            return values if rows is None else values[rows]
+        chars = _field_bytes(self.raw, self.reclen, self.columns[name])
+        if rows is not None:
+            chars = chars[rows]
+        return _decode(chars, self.columns[name])
+#end class CdsTable
+
+def read_table(datafile, readme='ReadMe', columns=None):
+    table = CdsTable(datafile, readme, columns)
+
+    data = OrderedDict()
+    for name in table.keys():
+        data[name] = table.column(name)
+    return data
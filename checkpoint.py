@@ -0,0 +1,143 @@
+#!/usr/bin/python
+#
+# checkpoint.py: Binary checkpoints of the joined catalogue columns
+# Copyright (C) 2016  Andrew Tribick
+#
+# This program is free software; you can redistribute it and/or
+# modify it under the terms of the GNU General Public License
+# as published by the Free Software Foundation; either version 2
+# of the License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston,
+# MA  02110-1301, USA.
+
+from __future__ import print_function
+from __future__ import division
+
+import hashlib
+import json
+import os
+
+import numpy as np
+
+from sourcehash import source_fingerprint
+
+CHECKPOINT_VERSION = 1
+MANIFEST = 'manifest.json'
+
+def reader_fingerprint():
+    # Checkpoints written by a different version of the reader or the join
+    # are ignored.  hipjoin imports this module, so the modules are only
+    # imported once both are loaded.
+    import cdsread
+    import hipjoin
+    return source_fingerprint(cdsread, hipjoin)
+
+def file_hash(filename):
+    digest = hashlib.sha1()
+    with open(filename, 'rb') as f:
+        while True:
+            block = f.read(1 << 20)
+            if not block:
+                break
+            digest.update(block)
+    return digest.hexdigest()
+
+def _file_info(filename):
+    st = os.stat(filename)
+    return dict(name=os.path.abspath(filename),
+                size=st.st_size,
+                mtime=st.st_mtime)
+
+def _input_unchanged(recorded):
+    try:
+        info = _file_info(recorded['name'])
+    except OSError:
+        return False
+    if info['size'] != recorded['size']:
+        return False
+    if info['mtime'] == recorded['mtime']:
+        return True
+    # touched but possibly not modified
+    return file_hash(recorded['name']) == recorded['sha1']
+
+def column_files(directory, name):
+    return (os.path.join(directory, name + '.npy'),
+            os.path.join(directory, name + '.mask.npy'))
+
+def load_checkpoint(directory, inputs, columns):
+    # Returns a dict of memory-mapped masked arrays, or None if the
+    # checkpoint is missing or any of the input files have changed.
+    try:
+        with open(os.path.join(directory, MANIFEST), 'r') as f:
+            manifest = json.load(f)
+    except (IOError, ValueError):
+        return None
+
+    if (manifest.get('version') != CHECKPOINT_VERSION or
+            manifest.get('reader') != reader_fingerprint() or
+            manifest.get('columns') != list(columns) or
+            [r['name'] for r in manifest['inputs']] !=
+            [os.path.abspath(name) for name in inputs]):
+        return None
+
+    if not all(_input_unchanged(r) for r in manifest['inputs']):
+        return None
+
+    return load_columns(directory, columns)
+
+def invalidate_checkpoint(directory):
+    manifestfile = os.path.join(directory, MANIFEST)
+    if os.path.exists(manifestfile):
+        os.remove(manifestfile)
+
+def load_columns(directory, columns):
+    data = {}
+    for name in columns:
+        datafile, maskfile = column_files(directory, name)
+        values = np.load(datafile, mmap_mode='r')
+        mask = np.ma.nomask
+        if os.path.exists(maskfile):
+            mask = np.load(maskfile, mmap_mode='r')
+        data[name] = np.ma.MaskedArray(values, mask=mask, copy=False)
+    return data
+
+def save_columns(directory, columns, data):
+    if not os.path.isdir(directory):
+        os.makedirs(directory)
+
+    for name in columns:
+        datafile, maskfile = column_files(directory, name)
+        np.save(datafile, np.asarray(np.ma.getdata(data[name])))
+        mask = np.ma.getmask(data[name])
+        if mask is not np.ma.nomask and mask.any():
+            np.save(maskfile, mask)
+        elif os.path.exists(maskfile):
+            os.remove(maskfile)
+
+def write_manifest(directory, inputs, columns):
+    records = []
+    for name in inputs:
+        record = _file_info(name)
+        record['sha1'] = file_hash(name)
+        records.append(record)
+
+    # the manifest is written last so an interrupted save is never used
+    with open(os.path.join(directory, MANIFEST), 'w') as f:
+        json.dump(dict(version=CHECKPOINT_VERSION,
+                       reader=reader_fingerprint(),
+                       columns=list(columns),
+                       inputs=records),
+                  f, indent=1)
+
+def save_checkpoint(directory, inputs, columns, data):
+    invalidate_checkpoint(directory)
+    save_columns(directory, columns, data)
+    write_manifest(directory, inputs, columns)
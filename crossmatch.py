@@ -0,0 +1,212 @@
+#!/usr/bin/python
+#
+# crossmatch.py: Positional cross-match of two catalogues
+# Copyright (C) 2016  Andrew Tribick
+#
+# This program is free software; you can redistribute it and/or
+# modify it under the terms of the GNU General Public License
+# as published by the Free Software Foundation; either version 2
+# of the License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston,
+# MA  02110-1301, USA.
+
+from __future__ import print_function
+from __future__ import division
+from builtins import range
+
+import numpy as np
+
+from hipjoin import take_rows
+
+MATCH_RADIUS = 1.0  # arcsec
+
+# Query rows are matched this many at a time, which bounds the number of
+# candidate pairs held in memory
+CHUNK_ROWS = 1 << 18
+
+# Cells along each axis of the hash, limited so that cell keys fit in an
+# int64; smaller radii just give more candidates per cell
+MAX_CELLS = 1 << 20
+
+def unit_vectors(RAdeg, DEdeg):
+    ra = np.radians(RAdeg)
+    dec = np.radians(DEdeg)
+    cosdec = np.cos(dec)
+    return np.column_stack((cosdec*np.cos(ra), cosdec*np.sin(ra),
+                            np.sin(dec)))
+
+def chord_length(radius):
+    # straight-line distance between unit vectors radius arcsec apart
+    return 2*np.sin(np.radians(radius / 3600) / 2)
+
+def separations(chord):
+    return np.degrees(2*np.arcsin(np.minimum(chord / 2, 1))) * 3600
+
+def _expand(lo, hi):
+    # (query, position) pairs for the ranges lo[i]:hi[i]
+    counts = hi - lo
+    query = np.repeat(np.arange(len(lo)), counts)
+    starts = np.cumsum(counts) - counts
+    within = np.arange(len(query)) - np.repeat(starts, counts)
+    return query, np.repeat(lo, counts) + within
+
+class SpatialHash(object):
+    # Unit vectors bucketed into cubic cells at least one match radius
+    # across, so that every neighbour of a point lies in the 27 cells
+    # around its own.  The keys are kept sorted for binary search.
+    def __init__(self, vectors, radius=MATCH_RADIUS):
+        self.vectors = vectors
+        self.cell = max(chord_length(radius), 2 / (MAX_CELLS - 3))
+        # one spare cell on each side, so neighbour keys never wrap
+        self.ncells = int(2 / self.cell) + 3
+        keys = self._keys(self._cells(vectors))
+        self.order = np.argsort(keys, kind='mergesort')
+        self.keys = keys[self.order]
+
+    def __len__(self):
+        return len(self.vectors)
+
+    def _cells(self, vectors):
+        return np.floor((vectors + 1) / self.cell).astype(np.int64) + 1
+
+    def _keys(self, cells):
+        n = self.ncells
+        return (cells[:, 0]*n + cells[:, 1])*n + cells[:, 2]
+
+    def candidates(self, vectors):
+        # (query row, indexed row) pairs of points in neighbouring cells.
+        # Along z the three neighbours have consecutive keys, so each of
+        # the nine x-y neighbours is a single range of the sorted keys.
+        n = self.ncells
+        keys = self._keys(self._cells(vectors))
+        queries = []
+        rows = []
+        for dx in (-1, 0, 1):
+            for dy in (-1, 0, 1):
+                key = keys + (dx*n + dy)*n
+                lo = np.searchsorted(self.keys, key - 1, side='left')
+                hi = np.searchsorted(self.keys, key + 1, side='right')
+                query, position = _expand(lo, hi)
+                queries.append(query)
+                rows.append(self.order[position])
+        return np.concatenate(queries), np.concatenate(rows)
+
+    def nearest(self, vectors, radius=MATCH_RADIUS):
+        # Returns (query rows, indexed rows, chord lengths) of the nearest
+        # indexed point within radius of each query point that has one.
+        # Ties go to the lower indexed row.
+        query, row = self.candidates(vectors)
+        chord = np.sqrt(((vectors[query] - self.vectors[row])**2).sum(axis=1))
+        within = chord <= chord_length(radius)
+        query, row, chord = query[within], row[within], chord[within]
+
+        order = np.lexsort((row, chord, query))
+        query, row, chord = query[order], row[order], chord[order]
+        first = np.ones(len(query), dtype=bool)
+        first[1:] = query[1:] != query[:-1]
+        return query[first], row[first], chord[first]
+#end class SpatialHash
+
+def match_indices(RA1, DE1, RA2, DE2, radius=MATCH_RADIUS,
+                  chunk_rows=CHUNK_ROWS):
+    # Best match in the second catalogue for each row of the first, within
+    # radius arcsec.  Returns (rows1, rows2, separations in arcsec), in
+    # increasing order of rows1.  Positions may be masked arrays; masked
+    # rows are never matched.
+    valid1 = np.flatnonzero(~(np.ma.getmaskarray(RA1) |
+                              np.ma.getmaskarray(DE1)))
+    valid2 = np.flatnonzero(~(np.ma.getmaskarray(RA2) |
+                              np.ma.getmaskarray(DE2)))
+    index = SpatialHash(unit_vectors(np.ma.getdata(RA2)[valid2],
+                                     np.ma.getdata(DE2)[valid2]), radius)
+
+    rows1 = []
+    rows2 = []
+    chords = []
+    for start in range(0, len(valid1), chunk_rows):
+        rows = valid1[start:start+chunk_rows]
+        query, row, chord = index.nearest(
+            unit_vectors(np.ma.getdata(RA1)[rows], np.ma.getdata(DE1)[rows]),
+            radius)
+        rows1.append(rows[query])
+        rows2.append(valid2[row])
+        chords.append(chord)
+
+    if not rows1:
+        return (np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64),
+                np.empty(0))
+    return (np.concatenate(rows1), np.concatenate(rows2),
+            separations(np.concatenate(chords)))
+
+def _fill(values, rows, other, name, other_rows):
+    # values with the masked entries at rows replaced by column name of
+    # other at other_rows
+    missing = np.ma.getmaskarray(values)[rows]
+    rows = rows[missing]
+    replacement = take_rows(other, name, other_rows[missing])
+    dtype = np.promote_types(values.dtype, replacement.dtype)
+    values = np.ma.array(values, dtype=dtype, copy=True)
+    values[rows] = replacement.astype(dtype)
+    return values
+
+def _masked(dtype, count):
+    return np.ma.array(np.zeros(count, dtype=dtype),
+                       mask=np.ones(count, dtype=bool))
+
+def merge(data, other, key='HIP', columns=None, radius=MATCH_RADIUS,
+          RA='RAdeg', DE='DEdeg'):
+    # Cross-matches the rows of data, a dict of masked columns as returned
+    # by hipjoin.join, with the table other by position.  Returns
+    # (merged data, matched rows, appended rows).
+    #
+    # Values missing from data are taken from the best match in other, for
+    # the columns both tables have.  The separation of each match in
+    # arcsec is added as the column Sep.  If other has a key column, its
+    # rows that are not the best match of any row of data, and whose key
+    # is not already used, are appended as new stars.
+    columns = list(data.keys() if columns is None else columns)
+    rows, other_rows, sep = match_indices(data[RA], data[DE],
+                                          other[RA], other[DE], radius)
+
+    merged = {}
+    shared = [name for name in columns if name in other and
+              name not in (key, RA, DE)]
+    for name in columns:
+        if name in shared:
+            merged[name] = _fill(data[name], rows, other, name, other_rows)
+        else:
+            merged[name] = np.ma.array(data[name], copy=True)
+    count = len(merged[columns[0]])
+    merged['Sep'] = _masked(np.float64, count)
+    merged['Sep'][rows] = sep
+
+    appended = np.empty(0, dtype=np.int64)
+    if key in other:
+        unmatched = np.ones(len(other[key]), dtype=bool)
+        unmatched[other_rows] = False
+        unmatched &= ~np.ma.getmaskarray(other[key])
+        unmatched &= ~(np.ma.getmaskarray(other[RA]) |
+                       np.ma.getmaskarray(other[DE]))
+        keys = np.ma.getdata(other[key])
+        unmatched &= ~np.in1d(keys, np.ma.getdata(data[key]))
+        appended = np.flatnonzero(unmatched)
+
+    if len(appended):
+        for name in columns + ['Sep']:
+            if name in other and name != 'Sep':
+                values = take_rows(other, name, appended)
+            else:
+                values = _masked(merged[name].dtype, len(appended))
+            dtype = np.promote_types(merged[name].dtype, values.dtype)
+            merged[name] = np.ma.concatenate([merged[name].astype(dtype),
+                                              values.astype(dtype)])
+
+    return merged, rows, appended
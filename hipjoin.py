@@ -0,0 +1,159 @@
+#!/usr/bin/python
+#
+# hipjoin.py: Inner join of catalogue columns on an integer key
+# Copyright (C) 2016  Andrew Tribick
+#
+# This program is free software; you can redistribute it and/or
+# modify it under the terms of the GNU General Public License
+# as published by the Free Software Foundation; either version 2
+# of the License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston,
+# MA  02110-1301, USA.
+
+from __future__ import print_function
+from __future__ import division
+from builtins import range
+
+import os
+
+import numpy as np
+
+from checkpoint import column_files, load_columns
+
+# A dense key-to-row array is used while it is at most this many times
+# larger than the table being indexed
+DENSE_FACTOR = 4
+
+def _dense_index(keys):
+    if len(keys) == 0 or keys.min() < 0:
+        return None
+    size = int(keys.max()) + 1
+    if size > DENSE_FACTOR * len(keys) + 1024:
+        return None
+    index = np.full(size, -1, dtype=np.int64)
+    index[keys] = np.arange(len(keys))
+    if np.count_nonzero(index >= 0) != len(keys):
+        # duplicate keys
+        return None
+    return index
+
+def join_indices(left_keys, right_keys):
+    # Row indices of the inner join, in key order.  Rows with equal keys
+    # keep their original order, duplicates give every pairing.
+    left_keys = np.asarray(left_keys)
+    right_keys = np.asarray(right_keys)
+    left_order = np.argsort(left_keys, kind='mergesort')
+    left_sorted = left_keys[left_order]
+
+    index = _dense_index(right_keys)
+    if index is not None:
+        inrange = (left_sorted >= 0) & (left_sorted < len(index))
+        right_rows = np.full(len(left_sorted), -1, dtype=np.int64)
+        right_rows[inrange] = index[left_sorted[inrange]]
+        found = right_rows >= 0
+        return left_order[found], right_rows[found]
+
+    right_order = np.argsort(right_keys, kind='mergesort')
+    right_sorted = right_keys[right_order]
+    lo = np.searchsorted(right_sorted, left_sorted, side='left')
+    hi = np.searchsorted(right_sorted, left_sorted, side='right')
+    counts = hi - lo
+
+    left_rows = np.repeat(left_order, counts)
+    ends = np.cumsum(counts)
+    within = np.arange(ends[-1] if len(ends) else 0) - np.repeat(ends - counts, counts)
+    right_rows = right_order[np.repeat(lo, counts) + within]
+    return left_rows, right_rows
+
+def take_rows(table, name, rows):
+    # only the selected rows of a CdsTable column are decoded
+    if hasattr(table, 'column'):
+        return table.column(name, rows)
+    return table[name][rows]
+
+def _output_names(left, right, key, columns):
+    names = []
+    for side, table in ((0, left), (1, right)):
+        for name in table.keys():
+            if side == 1 and name == key:
+                continue
+            if columns is not None and name not in columns:
+                continue
+            names.append((side, name))
+
+    # as in astropy.table.join, clashing names get _1 and _2 suffixes
+    counts = {}
+    for _, name in names:
+        counts[name] = counts.get(name, 0) + 1
+    return [(side, name, name if counts[name] == 1 else
+             '%s_%d' % (name, side + 1)) for side, name in names]
+
+def join_chunks(left, right, key='HIP', columns=None, chunk_rows=1 << 20):
+    # Yields the inner join chunk_rows rows at a time, as dicts of masked
+    # columns.  Only the key columns and the row indices are held for the
+    # whole table.
+    left_rows, right_rows = join_indices(np.ma.getdata(left[key]),
+                                         np.ma.getdata(right[key]))
+    names = _output_names(left, right, key, columns)
+    rows = (left_rows, right_rows)
+    tables = (left, right)
+
+    for start in range(0, len(left_rows), chunk_rows):
+        chunk = slice(start, start + chunk_rows)
+        yield dict((outname, take_rows(tables[side], name, rows[side][chunk]))
+                   for side, name, outname in names)
+
+def join(left, right, key='HIP', columns=None, outdir=None,
+         chunk_rows=1 << 20):
+    # Inner join of two tables of masked columns.  Only the key column and
+    # the projected columns are gathered.  With outdir, the result is
+    # written to memory-mapped .npy files chunk by chunk and only the key
+    # and row index arrays are held in memory.
+    left_rows, right_rows = join_indices(np.ma.getdata(left[key]),
+                                         np.ma.getdata(right[key]))
+    names = _output_names(left, right, key, columns)
+    rows = (left_rows, right_rows)
+    tables = (left, right)
+
+    if outdir is None:
+        data = {}
+        for side, name, outname in names:
+            data[outname] = take_rows(tables[side], name, rows[side])
+        return data
+
+    if not os.path.isdir(outdir):
+        os.makedirs(outdir)
+
+    count = len(left_rows)
+    outputs = {}
+    for start in range(0, max(count, 1), chunk_rows):
+        chunk = slice(start, min(start + chunk_rows, count))
+        for side, name, outname in names:
+            values = take_rows(tables[side], name, rows[side][chunk])
+            if outname not in outputs:
+                datafile, maskfile = column_files(outdir, outname)
+                outputs[outname] = (
+                    np.lib.format.open_memmap(datafile, mode='w+',
+                                              dtype=values.dtype,
+                                              shape=(count,)),
+                    np.lib.format.open_memmap(maskfile, mode='w+',
+                                              dtype=np.bool_,
+                                              shape=(count,)))
+            outdata, outmask = outputs[outname]
+            outdata[chunk] = np.ma.getdata(values)
+            outmask[chunk] = np.ma.getmaskarray(values)
+
+    for outdata, outmask in outputs.values():
+        outdata.flush()
+        outmask.flush()
+    del outputs
+
+    return load_columns(outdir, [outname for _, _, outname in names])
@@ -0,0 +1,61 @@
+#!/usr/bin/python
+#
+# incremental.py: Build manifests for incremental stars.dat rebuilds
+# Copyright (C) 2016  Andrew Tribick
+#
+# This program is free software; you can redistribute it and/or
+# modify it under the terms of the GNU General Public License
+# as published by the Free Software Foundation; either version 2
+# of the License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston,
+# MA  02110-1301, USA.
+
+from __future__ import print_function
+from __future__ import division
+from builtins import range
+
+import os
+
+import numpy as np
+
+FNV_OFFSET = np.uint64(0xcbf29ce484222325)
+FNV_PRIME = np.uint64(0x100000001b3)
+
+def _row_bytes(column):
+    values = np.array(np.ma.getdata(column))
+    mask = np.ma.getmaskarray(column)
+    # the value under a mask is not significant
+    values[mask] = np.zeros(1, dtype=values.dtype)[0]
+    rowbytes = values.view(np.uint8).reshape(len(values), -1)
+    return np.hstack((rowbytes, mask.view(np.uint8).reshape(-1, 1)))
+
+def row_hashes(data, columns):
+    # 64-bit FNV-1a hash of each row's values and masks
+    rowbytes = np.hstack([_row_bytes(data[name]) for name in columns])
+    hashes = np.full(len(rowbytes), FNV_OFFSET, dtype=np.uint64)
+    for i in range(rowbytes.shape[1]):
+        hashes ^= rowbytes[:, i]
+        hashes *= FNV_PRIME
+    return hashes
+
+def load_manifest(filename, fingerprint):
+    if not os.path.exists(filename):
+        return None
+    with np.load(filename) as manifest:
+        if str(manifest['fingerprint']) != fingerprint:
+            return None
+        return dict((name, manifest[name])
+                    for name in ('hip', 'hash', 'status', 'record'))
+
+def save_manifest(filename, fingerprint, hip, hashes, status, records):
+    with open(filename, 'wb') as f:
+        np.savez(f, fingerprint=np.array(fingerprint), hip=hip, hash=hashes,
+                 status=status, record=records)
@@ -0,0 +1,36 @@
+#!/usr/bin/python
+#
+# sourcehash.py: Fingerprints of module source files
+# Copyright (C) 2016  Andrew Tribick
+#
+# This program is free software; you can redistribute it and/or
+# modify it under the terms of the GNU General Public License
+# as published by the Free Software Foundation; either version 2
+# of the License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston,
+# MA  02110-1301, USA.
+
+from __future__ import print_function
+from __future__ import division
+
+import hashlib
+
+def source_fingerprint(*modules):
+    # SHA-1 over the source of the modules, so that files derived by a
+    # different version of the code can be recognised and discarded
+    digest = hashlib.sha1()
+    for module in modules:
+        filename = module.__file__
+        if filename.endswith(('.pyc', '.pyo')):
+            filename = filename[:-1]
+        with open(filename, 'rb') as f:
+            digest.update(f.read())
+    return digest.hexdigest()
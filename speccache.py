@@ -0,0 +1,311 @@
+#!/usr/bin/python
+#
+# speccache.py: Memoized classification of spectral type strings
+# Copyright (C) 2016  Andrew Tribick
+#
+# This program is free software; you can redistribute it and/or
+# modify it under the terms of the GNU General Public License
+# as published by the Free Software Foundation; either version 2
+# of the License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston,
+# MA  02110-1301, USA.
+
+from __future__ import print_function
+from __future__ import division
+from builtins import range
+
+import json
+import multiprocessing
+import os
+import sys
+from collections import OrderedDict
+
+import numpy as np
+
+import specinfo
+import specparse
+from sourcehash import source_fingerprint
+from specparse import SpecParser
+from specinfo import CelestiaSpectrum, IvoaSpectrum, SpecInfo
+
+CACHE_VERSION = 2
+
+# Strings sent to a worker process at a time
+WORKER_CHUNK = 256
+
+# Spectral types are byte strings and need not be valid UTF-8, so strings
+# are saved decoded as latin-1, which maps every byte to a character
+
+def _text(value):
+    if isinstance(value, bytes):
+        return value.decode('latin-1')
+    if isinstance(value, (tuple, list)):
+        return [_text(item) for item in value]
+    return value
+
+def _native(value):
+    # json returns unicode strings under Python 2
+    if value is None:
+        return None
+    if str is bytes:
+        return value.encode('latin-1')
+    return str(value)
+
+def _key(sptype):
+    # the spectral types looked up are bytes under Python 3 as well
+    return sptype.encode('latin-1')
+
+def _info_fields(info):
+    # A SpecInfo as a tuple of plain values, as saved and as sent back by
+    # the classify_many workers
+    if info is None:
+        return None
+    return (info.tclass, info.subclass, info.lclass, info.pecs, info.comp)
+
+def _info_from_fields(fields):
+    if fields is None:
+        return None
+    tclass, subclass, lclass, pecs, comp = fields
+    return SpecInfo(tclass=_native(tclass),
+                    subclass=subclass,
+                    lclass=_native(lclass),
+                    pecs=[(_native(p[0]), _native(p[1])) for p in pecs],
+                    comp=_native(comp))
+
+# Per-process cache used by the classify_many workers
+_worker_cache = None
+
+def _init_worker():
+    global _worker_cache
+    _worker_cache = SpecCache()
+
+def worker_pool(jobs):
+    # Worker processes for classify_many, or None to classify in this
+    # process.  One pool serves every call of a build; close and join it
+    # when done.
+    if jobs <= 1:
+        return None
+    return multiprocessing.Pool(jobs, _init_worker)
+
+def _classify_chunk(sptypes):
+    # The codes are sent back as compact arrays, the SpecInfo as fields
+    fast_parses = _worker_cache.fast_parses
+    full_parses = _worker_cache.full_parses
+    parse_errors = _worker_cache.parse_errors
+    parse_failures = _worker_cache.parse_failures
+    celestia_codes, ivoa_codes, specinfos = \
+        _worker_cache.classify_missing(sptypes)
+    return (celestia_codes, ivoa_codes,
+            [_info_fields(info) for info in specinfos],
+            _worker_cache.fast_parses - fast_parses,
+            _worker_cache.full_parses - full_parses,
+            _worker_cache.parse_errors - parse_errors,
+            _worker_cache.parse_failures - parse_failures)
+
+class SpecCache(object):
+    def __init__(self, parser=None, maxsize=None):
+        self._parser = parser
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.fast_parses = 0
+        self.full_parses = 0
+        # strings the parser reported errors for, and those that gave no
+        # spectral class at all
+        self.parse_errors = 0
+        self.parse_failures = 0
+        self._entries = OrderedDict()
+        self._dirty = False
+
+    @property
+    def parser(self):
+        # only built once a string is missing from the cache
+        if self._parser is None:
+            self._parser = SpecParser()
+        return self._parser
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __contains__(self, sptype):
+        return sptype in self._entries
+
+    def classify(self, sptype):
+        # Returns (Celestia code, IVOA code, SpecInfo); entries are shared
+        # between callers, which is safe as SpecInfo is immutable.
+        entry = self._entries.get(sptype)
+        if entry is not None:
+            self.hits += 1
+            if self.maxsize is not None:
+                # move to the most recently used end
+                del self._entries[sptype]
+                self._entries[sptype] = entry
+            return entry
+
+        self.misses += 1
+        specinfo = self._parse(sptype)
+        ivoa = IvoaSpectrum.create(specinfo)
+        entry = (CelestiaSpectrum.from_ivoa(ivoa).code, ivoa.code, specinfo)
+        self._store(sptype, entry)
+        return entry
+
+    def _parse(self, sptype):
+        specinfo = SpecParser.parse_canonical(sptype)
+        if specinfo is not None:
+            self.fast_parses += 1
+        else:
+            self.full_parses += 1
+            specinfo = self.parser.parse(sptype)
+            self._count_errors(specinfo, self.parser.errors)
+        return specinfo
+
+    def _count_errors(self, specinfo, errors):
+        if errors:
+            self.parse_errors += 1
+        if specinfo is None or specinfo.tclass is None:
+            self.parse_failures += 1
+
+    def classify_missing(self, sptypes):
+        # Parses strings that are not in the cache and computes their codes
+        # as arrays in one batch.  Returns (Celestia codes, IVOA codes,
+        # SpecInfo list) without storing anything.
+        parser = self.parser
+        fast_parses = parser.fast_parses
+        full_parses = parser.full_parses
+        specinfos = []
+        for specinfo, errors in parser.parse_many(sptypes):
+            self._count_errors(specinfo, errors)
+            specinfos.append(specinfo)
+        self.fast_parses += parser.fast_parses - fast_parses
+        self.full_parses += parser.full_parses - full_parses
+
+        ivoa_codes = IvoaSpectrum.codes(specinfos)
+        self.misses += len(sptypes)
+        return (CelestiaSpectrum.codes_from_ivoa(ivoa_codes), ivoa_codes,
+                specinfos)
+
+    def classify_many(self, sptypes, pool=None):
+        # Returns arrays of Celestia and IVOA codes for a sequence of
+        # distinct strings.  With a pool from worker_pool, the strings not
+        # yet in the cache are split across its processes.
+        celestia_codes = np.empty(len(sptypes), dtype=np.uint16)
+        ivoa_codes = np.empty(len(sptypes), dtype=np.uint32)
+
+        missing = []
+        for i, sptype in enumerate(sptypes):
+            if sptype in self._entries:
+                celestia_codes[i], ivoa_codes[i], _ = self.classify(sptype)
+            else:
+                missing.append(i)
+        if not missing:
+            return celestia_codes, ivoa_codes
+
+        missing_sptypes = [sptypes[i] for i in missing]
+        if pool is None:
+            celestia, ivoa, specinfos = self.classify_missing(missing_sptypes)
+        else:
+            chunks = [missing_sptypes[i:i+WORKER_CHUNK]
+                      for i in range(0, len(missing), WORKER_CHUNK)]
+            results = pool.map(_classify_chunk, chunks)
+
+            celestia = np.concatenate([r[0] for r in results])
+            ivoa = np.concatenate([r[1] for r in results])
+            specinfos = [_info_from_fields(fields)
+                         for r in results for fields in r[2]]
+            self.misses += len(missing)
+            for _, _, _, fast, full, errors, failed in results:
+                self.fast_parses += fast
+                self.full_parses += full
+                self.parse_errors += errors
+                self.parse_failures += failed
+
+        celestia_codes[missing] = celestia
+        ivoa_codes[missing] = ivoa
+        for sptype, celestia_code, ivoa_code, specinfo in zip(
+                missing_sptypes, celestia.tolist(), ivoa.tolist(), specinfos):
+            self._store(sptype, (celestia_code, ivoa_code, specinfo))
+
+        return celestia_codes, ivoa_codes
+
+    def _store(self, sptype, entry):
+        if self.maxsize is not None:
+            if self.maxsize <= 0:
+                return
+            while len(self._entries) >= self.maxsize:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+        self._entries[sptype] = entry
+        self._dirty = True
+
+    @staticmethod
+    def fingerprint():
+        return '%d:%s' % (CACHE_VERSION,
+                          source_fingerprint(specparse, specinfo,
+                                             sys.modules[__name__]))
+
+    def load(self, filename):
+        # Entries written by a different grammar or mapping are ignored
+        try:
+            with open(filename, 'r') as f:
+                data = json.load(f)
+        except (IOError, ValueError):
+            return 0
+
+        if data.get('fingerprint') != SpecCache.fingerprint():
+            return 0
+
+        count = 0
+        for sptype, (celestia_code, ivoa_code, fields) in data.get('entries', {}).items():
+            self._store(_key(sptype), (celestia_code, ivoa_code,
+                                       _info_from_fields(fields)))
+            count += 1
+        self._dirty = False
+        return count
+
+    def save(self, filename):
+        if not self._dirty and os.path.exists(filename):
+            return
+
+        entries = {}
+        for sptype, (celestia_code, ivoa_code, info) in self._entries.items():
+            entries[_text(sptype)] = (celestia_code, ivoa_code,
+                                      _text(_info_fields(info)))
+
+        tmpname = filename + '.tmp'
+        try:
+            with open(tmpname, 'w') as f:
+                json.dump(dict(fingerprint=SpecCache.fingerprint(),
+                               entries=entries),
+                          f, sort_keys=True)
+        except BaseException:
+            if os.path.exists(tmpname):
+                os.remove(tmpname)
+            raise
+        if os.path.exists(filename):
+            os.remove(filename)
+        os.rename(tmpname, filename)
+        self._dirty = False
+
+    def clear(self):
+        self._entries.clear()
+
+    def stats(self):
+        return dict(hits=self.hits,
+                    misses=self.misses,
+                    evictions=self.evictions,
+                    fast_parses=self.fast_parses,
+                    full_parses=self.full_parses,
+                    parse_errors=self.parse_errors,
+                    parse_failures=self.parse_failures,
+                    size=len(self._entries),
+                    maxsize=self.maxsize)
+#end class SpecCache
@@ -18,13 +18,70 @@
 # Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston,
 # MA  02110-1301, USA.
 
+import numpy as np
+
+# Peculiarity tuples and whole peculiarity lists are interned, so the many
+# results sharing them hold references to a single copy.  Tuples can't be
+# weakly referenced, so the table is bounded instead: once it is full, new
+# values are used as they are.
+PECS_INTERN_LIMIT = 4096
+_interned_pecs = {}
+
+def _intern(value):
+    interned = _interned_pecs.get(value)
+    if interned is None:
+        if len(_interned_pecs) >= PECS_INTERN_LIMIT:
+            return value
+        _interned_pecs[value] = interned = value
+    return interned
+
+def _intern_pecs(pecs):
+    return _intern(tuple(_intern(tuple(pec)) for pec in pecs))
+
 class SpecInfo(object):
-    def __init__(self, **kwargs):
-        self.tclass = kwargs.get("tclass", None)
-        self.subclass = kwargs.get("subclass", None)
-        self.lclass = kwargs.get("lclass", None)
-        self.pecs = kwargs.get("pecs", [])
-        self.comp = kwargs.get("comp", None)
+    # Immutable: use replace() or add_pecs() to derive a modified copy
+    __slots__ = ('tclass', 'subclass', 'lclass', 'pecs', 'comp')
+
+    def __init__(self, tclass=None, subclass=None, lclass=None, pecs=(),
+                 comp=None):
+        setattr = object.__setattr__
+        setattr(self, 'tclass', tclass)
+        setattr(self, 'subclass', subclass)
+        setattr(self, 'lclass', lclass)
+        setattr(self, 'pecs', _intern_pecs(pecs) if pecs else ())
+        setattr(self, 'comp', comp)
+
+    def __setattr__(self, name, value):
+        raise AttributeError('SpecInfo is immutable')
+
+    def __delattr__(self, name):
+        raise AttributeError('SpecInfo is immutable')
+
+    def __reduce__(self):
+        return (SpecInfo, self._fields())
+
+    def _fields(self):
+        return (self.tclass, self.subclass, self.lclass, self.pecs, self.comp)
+
+    def __eq__(self, other):
+        return isinstance(other, SpecInfo) and self._fields() == other._fields()
+
+    def __ne__(self, other):
+        return not self == other
+
+    def __hash__(self):
+        return hash(self._fields())
+
+    def replace(self, **changes):
+        get = changes.get
+        return SpecInfo(get('tclass', self.tclass),
+                        get('subclass', self.subclass),
+                        get('lclass', self.lclass),
+                        get('pecs', self.pecs),
+                        get('comp', self.comp))
+
+    def add_pecs(self, *pecs):
+        return self.replace(pecs=self.pecs + pecs)
     
     def __repr__(self):
         r = []
@@ -247,6 +304,24 @@ class IvoaSpectrum(object):
         if not specinfo:
             return IvoaSpectrum()
 
+        TT_code, tt_code, LL_code, PPPP_code = IvoaSpectrum._fields(specinfo)
+        return IvoaSpectrum(TT_code=TT_code, tt_code=tt_code, LL_code=LL_code, PPPP_code=PPPP_code)
+
+    @staticmethod
+    def codes(specinfos):
+        # The IVOA codes of a sequence of SpecInfo results as a uint32
+        # array, without creating an IvoaSpectrum for each
+        codes = []
+        for specinfo in specinfos:
+            if specinfo:
+                TT_code, tt_code, LL_code, PPPP_code = IvoaSpectrum._fields(specinfo)
+                codes.append((TT_code<<25) + (tt_code<<20) + (LL_code<<14) + PPPP_code)
+            else:
+                codes.append(0)
+        return np.array(codes, dtype=np.uint32)
+
+    @staticmethod
+    def _fields(specinfo):
         TT_code = IvoaSpectrum._get_TT(specinfo.tclass)
         
         tt_code = 0
@@ -276,7 +351,7 @@ class IvoaSpectrum(object):
         
         PPPP_code = IvoaSpectrum._get_PPPP(specinfo, TT_code, LL_code)
 
-        return IvoaSpectrum(TT_code=TT_code, tt_code=tt_code, LL_code=LL_code, PPPP_code=PPPP_code)
+        return TT_code, tt_code, LL_code, PPPP_code
 
     @staticmethod
     def _get_PPPP(specinfo, TT_code, ll_code):
@@ -515,61 +590,116 @@ class CelestiaSpectrum(object):
         # 56 OB unsupported, use B0 instead
     }
     
+    # Spectral class names and luminosity classes as read by Celestia
+    CLASS_NAMES = ('O', 'B', 'A', 'F', 'G', 'K', 'M', 'R', 'S', 'N',
+                   'WC', 'WN', '?', 'L', 'T', 'C')
+    WD_NAMES = ('DA', 'DB', 'DC', 'DO', 'DQ', 'DZ', 'D', 'DX')
+    LUM_NAMES = ('Ia0', 'Ia', 'Ib', 'II', 'III', 'IV', 'V', 'VI')
+
     def __init__(self, **kwargs):
         self.code = kwargs.get('code', 0x0ca8)
+
+    def __str__(self):
+        startype = self.code >> 12
+        kt = self.code >> 8 & 15
+        s = self.code >> 4 & 15
+        l = self.code & 15
+        if startype == 2:
+            return 'Q'
+        elif startype == 3:
+            return 'X'
+        elif startype == 1:
+            return CelestiaSpectrum.WD_NAMES[kt]
+        elif kt == 12:
+            return '?'
+
+        name = CelestiaSpectrum.CLASS_NAMES[kt]
+        if s < 10:
+            name += str(s)
+        if l < len(CelestiaSpectrum.LUM_NAMES):
+            name += CelestiaSpectrum.LUM_NAMES[l]
+        return name
     
     @staticmethod
     def create(specinfo):
-        ivoa = IvoaSpectrum.create(specinfo)
-        kt = 12
-        s = 10
-        l = 8
-        if ivoa.TT_code in CelestiaSpectrum.MAP_TT:
-            kt = CelestiaSpectrum.MAP_TT[ivoa.TT_code]
-        elif ivoa.TT_code == 19:
-            kt = 14
-            s = 9
-        elif ivoa.TT_code == 31:
-            kt = 0
-            l = 7
-        elif ivoa.TT_code == 32:
-            kt = 1
-            l = 7
-        elif ivoa.TT_code == 33:
-            kt = 2
-            l = 7
-        elif ivoa.TT_code == 56:
-            kt = 1
-            s = 0
-        
+        return CelestiaSpectrum.from_ivoa(IvoaSpectrum.create(specinfo))
+
+    @staticmethod
+    def from_ivoa(ivoa):
+        kt = CelestiaSpectrum.TT_KT[ivoa.TT_code]
+        s = CelestiaSpectrum.TT_SUBCLASS[ivoa.TT_code]
+        l = CelestiaSpectrum.TT_LUM[ivoa.TT_code]
+
         if kt < 16 and kt != 12:
             if s == 10:
-                if 10 <= ivoa.tt_code <= 19:
-                    s = ivoa.tt_code - 10
-                elif ivoa.tt_code == 20:
-                    # 10 unsupported, use 9
-                    s = 9
-            
+                s = CelestiaSpectrum.tt_SUBCLASS[ivoa.tt_code]
             if l == 8:
-                if ivoa.LL_code in (10,11):
-                    l = 0
-                elif ivoa.LL_code in (12,13,14):
-                    l = 1
-                elif ivoa.LL_code in (15,16,17):
-                    l = 2
-                elif ivoa.LL_code in (18,19,20,21):
-                    l = 3
-                elif ivoa.LL_code in (22,23,24,25):
-                    l = 4
-                elif ivoa.LL_code in (26,27,28,29):
-                    l = 5
-                elif ivoa.LL_code in (30,31):
-                    l = 6
-                elif ivoa.LL_code in (32,33,34,35):
-                    l = 7
+                l = CelestiaSpectrum.LL_LUM[ivoa.LL_code]
         else:
             l = 0
             if kt >= 32:
                 s = 0
-        
-        return CelestiaSpectrum(code=(kt<<8) + (s<<4) + l)
\ No newline at end of file
+
+        return CelestiaSpectrum(code=(kt<<8) + (s<<4) + l)
+
+    @staticmethod
+    def codes_from_ivoa(ivoa_codes):
+        # from_ivoa applied to an array of IVOA codes, giving uint16 codes
+        ivoa_codes = np.asarray(ivoa_codes, dtype=np.uint32)
+        TT_code = ivoa_codes >> 25
+        tt_code = ivoa_codes >> 20 & 31
+        LL_code = ivoa_codes >> 14 & 63
+
+        kt = CelestiaSpectrum.TT_KT_ARRAY[TT_code]
+        s = CelestiaSpectrum.TT_SUBCLASS_ARRAY[TT_code]
+        l = CelestiaSpectrum.TT_LUM_ARRAY[TT_code]
+
+        normal = (kt < 16) & (kt != 12)
+        s = np.where(normal & (s == 10),
+                     CelestiaSpectrum.tt_SUBCLASS_ARRAY[tt_code], s)
+        s = np.where(kt >= 32, 0, s)
+        l = np.where(normal & (l == 8),
+                     CelestiaSpectrum.LL_LUM_ARRAY[LL_code], l)
+        l = np.where(normal, l, 0)
+
+        return ((kt<<8) + (s<<4) + l).astype(np.uint16)
+#end class CelestiaSpectrum
+
+def _celestia_tables():
+    # Lookup tables for from_ivoa, indexed by the IVOA TT, tt and LL fields
+    TT_kt = [12] * 128
+    TT_subclass = [10] * 128
+    TT_lum = [8] * 128
+    for TT_code, kt in CelestiaSpectrum.MAP_TT.items():
+        TT_kt[TT_code] = kt
+    # Y unsupported, use T9 instead
+    TT_kt[19], TT_subclass[19] = 14, 9
+    # subdwarf O, B and A also set the luminosity
+    TT_kt[31], TT_lum[31] = 0, 7
+    TT_kt[32], TT_lum[32] = 1, 7
+    TT_kt[33], TT_lum[33] = 2, 7
+    # OB unsupported, use B0 instead
+    TT_kt[56], TT_subclass[56] = 1, 0
+
+    # subclass 10 unsupported, use 9
+    tt_subclass = [10] * 32
+    for tt_code in range(10, 21):
+        tt_subclass[tt_code] = min(tt_code - 10, 9)
+
+    LL_lum = [8] * 64
+    for l, LL_codes in enumerate(((10, 11), (12, 13, 14), (15, 16, 17),
+                                  (18, 19, 20, 21), (22, 23, 24, 25),
+                                  (26, 27, 28, 29), (30, 31),
+                                  (32, 33, 34, 35))):
+        for LL_code in LL_codes:
+            LL_lum[LL_code] = l
+
+    return TT_kt, TT_subclass, TT_lum, tt_subclass, LL_lum
+
+(CelestiaSpectrum.TT_KT, CelestiaSpectrum.TT_SUBCLASS, CelestiaSpectrum.TT_LUM,
+ CelestiaSpectrum.tt_SUBCLASS, CelestiaSpectrum.LL_LUM) = _celestia_tables()
+CelestiaSpectrum.TT_KT_ARRAY = np.array(CelestiaSpectrum.TT_KT, dtype=np.uint16)
+CelestiaSpectrum.TT_SUBCLASS_ARRAY = np.array(CelestiaSpectrum.TT_SUBCLASS, dtype=np.uint16)
+CelestiaSpectrum.TT_LUM_ARRAY = np.array(CelestiaSpectrum.TT_LUM, dtype=np.uint16)
+CelestiaSpectrum.tt_SUBCLASS_ARRAY = np.array(CelestiaSpectrum.tt_SUBCLASS, dtype=np.uint16)
+CelestiaSpectrum.LL_LUM_ARRAY = np.array(CelestiaSpectrum.LL_LUM, dtype=np.uint16)
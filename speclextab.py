@@ -0,0 +1,11 @@
+# speclextab.py. This file automatically created by PLY (version 3.9). Don't edit!
+_tabversion   = '3.8'
+_lextokens    = set(('NUMMINUS', 'WORD', 'NUMPLUS', 'SPREFIX', 'LPREFIX', 'NUMBER', 'ELEMENT', 'PECULIARITY', 'ROMAN', 'MS', 'ELLIPSIS', 'TCLASS'))
+_lexreflags   = 0
+_lexliterals  = ',+/-'
+_lexstateinfo = {'INITIAL': 'inclusive', 'peculiar': 'exclusive', 'codes': 'exclusive'}
+_lexstatere   = {'INITIAL': [('(?P<t_TCLASS>[AFGKLTYR]|OB?[CN]?|B[CN]?|MS?|C(-([RNJ]|Hd?))?|SC?|D[ABCOQXZ]*[HP]*|NS?|PG|W[DRNCO]?|wd)|(?P<t_NUMBER>\\d+(\\.\\d*)?)|(?P<t_ROMAN>[IVX]+[abzABZ]*([\\-/][IVX0]*[abzABZ]*)?)|(?P<t_LPREFIX>g|d|sd|esd)|(?P<t_spfxorpec>[ghkm]|He)|(?P<t_INITIAL_peculiar_codes_plus>\\+)|(?P<t_ANY_minus>-)|(?P<t_slash>/)|(?P<t_comma>,)|(?P<t_peculiarswitch>[^,.\\-/+()])|(?P<t_INITIAL_peculiar_codes_ELLIPSIS>\\.{3}.*$)|(?P<t_ANY_paren>\\()|(?P<t_ANY_bracket>\\[)|(?P<t_INITIAL_peculiar_other>[^A-Za-z0-9 \\t:,+/\\-(\\[])', [None, ('t_TCLASS', 'TCLASS'), None, None, ('t_NUMBER', 'NUMBER'), None, ('t_ROMAN', 'ROMAN'), None, ('t_LPREFIX', 'LPREFIX'), ('t_spfxorpec', 'spfxorpec'), ('t_INITIAL_peculiar_codes_plus', 'plus'), ('t_ANY_minus', 'minus'), ('t_slash', 'slash'), ('t_comma', 'comma'), ('t_peculiarswitch', 'peculiarswitch'), ('t_INITIAL_peculiar_codes_ELLIPSIS', 'ELLIPSIS'), ('t_ANY_paren', 'paren'), ('t_ANY_bracket', 'bracket'), ('t_INITIAL_peculiar_other', 'other')])], 'peculiar': [('(?P<t_INITIAL_peculiar_codes_plus>\\+)|(?P<t_ANY_minus>-)|(?P<t_INITIAL_peculiar_codes_ELLIPSIS>\\.{3}.*$)|(?P<t_peculiar_WORD>[A-Za-z0-9][a-z0-9\\-]*)|(?P<t_ANY_paren>\\()|(?P<t_ANY_bracket>\\[)|(?P<t_INITIAL_peculiar_other>[^A-Za-z0-9 \\t:,+/\\-(\\[])', [None, ('t_INITIAL_peculiar_codes_plus', 'plus'), ('t_ANY_minus', 'minus'), ('t_INITIAL_peculiar_codes_ELLIPSIS', 'ELLIPSIS'), ('t_peculiar_WORD', 'WORD'), ('t_ANY_paren', 'paren'), ('t_ANY_bracket', 'bracket'), ('t_INITIAL_peculiar_other', 'other')])], 'codes': [('(?P<t_INITIAL_peculiar_codes_plus>\\+)|(?P<t_ANY_minus>-)|(?P<t_INITIAL_peculiar_codes_ELLIPSIS>\\.{3}.*$)|(?P<t_codes_space>\\s+)|(?P<t_ANY_paren>\\()|(?P<t_ANY_bracket>\\[)|(?P<t_codes_other>[^A-Zbdefhjmnpqsvw\\s:,+/\\-(\\[])|(?P<t_codes_PECULIARITY>([bdjq]|em?|f\\*?|ha?|nn?|p(ec)?|sh?|v(ar)?|wk?|m)[+\\-]?([0-9]+(\\.[0-9]*)?)?)|(?P<t_codes_ELEMENT>([A-Z][A-Za-z]?[0-9]?)[+\\-]?([0-9]+(\\.[0-9]*)?|[IVX]+([\\-/][IVX]+)?)?)', [None, ('t_INITIAL_peculiar_codes_plus', 'plus'), ('t_ANY_minus', 'minus'), ('t_INITIAL_peculiar_codes_ELLIPSIS', 'ELLIPSIS'), ('t_codes_space', 'space'), ('t_ANY_paren', 'paren'), ('t_ANY_bracket', 'bracket'), ('t_codes_other', 'other'), (None, 'PECULIARITY'), None, None, None, None, None, (None, 'ELEMENT')])]}
+_lexstateignore = {'codes': ':', 'INITIAL': ' \t:', 'peculiar': ' \t:'}
+_lexstateerrorf = {'codes': 't_codes_error', 'INITIAL': 't_INITIAL_peculiar_error', 'peculiar': 't_INITIAL_peculiar_error'}
+_lexstateeoff = {'INITIAL': 't_ANY_eof', 'peculiar': 't_ANY_eof', 'codes': 't_ANY_eof'}
+_specdigest = '3afcd01ee880dc5420ee8457d6d4d7c559925126'
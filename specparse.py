@@ -22,12 +22,67 @@ from __future__ import print_function
 from __future__ import division
 from builtins import range
 
+import hashlib
+import importlib
+import os
+import re
 import string
+import sys
 import ply.lex as lex
 import ply.yacc as yacc
 
 from specinfo import SpecInfo
 
+# Pre-generated tables, stamped with the digest of this file
+LEXTAB = 'speclextab'
+PARSETAB = 'specparsetab'
+
+_source_digest = None
+
+def source_digest():
+    global _source_digest
+    if _source_digest is None:
+        filename = __file__
+        if filename.endswith(('.pyc', '.pyo')):
+            filename = filename[:-1]
+        with open(filename, 'rb') as f:
+            _source_digest = hashlib.sha1(f.read()).hexdigest()
+    return _source_digest
+
+def _load_tables(name):
+    try:
+        tables = importlib.import_module(name)
+        digest = source_digest()
+    except (ImportError, IOError):
+        return None
+    if getattr(tables, '_specdigest', None) != digest:
+        return None
+    return tables
+
+def _bound_methods(obj, prefix):
+    return dict((name, getattr(obj, name))
+                for name in dir(type(obj)) if name.startswith(prefix))
+
+def build_tables(outputdir=None):
+    if outputdir is None:
+        outputdir = os.path.dirname(os.path.abspath(__file__))
+
+    for name in (LEXTAB, PARSETAB):
+        sys.modules.pop(name, None)
+        for ext in ('.py', '.pyc'):
+            filename = os.path.join(outputdir, name + ext)
+            if os.path.exists(filename):
+                os.remove(filename)
+
+    lexer = SpecLexer(tables=False)
+    lexer.lexer.writetab(LEXTAB, outputdir)
+    SpecParser(lexer, tables=False, tabmodule=PARSETAB, outputdir=outputdir,
+               write_tables=True, debug=False)
+
+    for name in (LEXTAB, PARSETAB):
+        with open(os.path.join(outputdir, name + '.py'), 'a') as f:
+            f.write('_specdigest = %r\n' % source_digest())
+
 class SpecLexer(object):
 
     tokens = (
@@ -87,13 +142,27 @@ class SpecLexer(object):
     t_peculiar_ignore = ' \t:'
     t_codes_ignore = ':'
 
-    def __init__(self, **kwargs):
-        self.lexer = lex.lex(module=self, **kwargs)
+    def __init__(self, tables=True, **kwargs):
+        self.lexer = None
+        if tables:
+            lextab = _load_tables(LEXTAB)
+            if lextab is not None:
+                # tables from another PLY version are rebuilt like stale ones
+                try:
+                    lexer = lex.Lexer()
+                    lexer.readtab(lextab, _bound_methods(self, 't_'))
+                    self.lexer = lexer
+                except ImportError:
+                    pass
+        if self.lexer is None:
+            self.lexer = lex.lex(module=self, **kwargs)
         self._has_tclass = False
         self._has_subclass = False
         self._has_lclass = False
         self._is_mspectrum = False
         self._is_plusminus = False
+        # characters skipped since the parser last cleared the list
+        self.errors = []
 
     def t_TCLASS(self, t):
         r'[AFGKLTYR]|OB?[CN]?|B[CN]?|MS?|C(-([RNJ]|Hd?))?|SC?|D[ABCOQXZ]*[HP]*|NS?|PG|W[DRNCO]?|wd'
@@ -122,7 +191,13 @@ class SpecLexer(object):
 
     def t_NUMBER(self, t):
         r'\d+(\.\d*)?'
-        lastsymbol = t.lexer.lexdata[:t.lexer.lexpos-len(t.value)].strip()[-1:]
+        # the last non-blank character before the number; only the blanks
+        # since the previous token are scanned
+        lexdata = t.lexer.lexdata
+        start = t.lexpos
+        while start > 0 and lexdata[start-1].isspace():
+            start -= 1
+        lastsymbol = lexdata[start-1:start] if start > 0 else ''
         if (self._has_lclass or self._has_subclass or lastsymbol == '+'):
             t.type = 'PECULIARITY'
             t.lexer.begin('peculiar')
@@ -242,43 +317,51 @@ class SpecLexer(object):
     
     def t_ANY_paren(self, t):
         r'\('
+        return self._group(t, '(', ')')
+
+    def t_ANY_bracket(self, t):
+        r'\['
+        return self._group(t, '[', ']')
+
+    def _group(self, t, opening, closing):
+        # The whole balanced group, or the rest of the input if it isn't
+        # closed, becomes one peculiarity.  The input is searched from
+        # one closing bracket to the next without being copied.
+        lexdata = t.lexer.lexdata
+        pos = t.lexer.lexpos
+        end = len(lexdata)
         level = 1
-        curpos = 1
-        for c in t.lexer.lexdata[t.lexer.lexpos:]:
-            if c == '(':
-                level += 1
-            elif c == ')':
-                level -= 1
-                if level == 0:
-                    break
-            curpos += 1
+        while True:
+            close = lexdata.find(closing, pos)
+            if close < 0:
+                break
+            level += lexdata.count(opening, pos, close) - 1
+            pos = close + 1
+            if level == 0:
+                end = pos
+                break
 
         t.type = 'PECULIARITY'
-        t.value = t.lexer.lexdata[t.lexer.lexpos-1:t.lexer.lexpos+curpos]
-        t.lexer.skip(curpos)
+        t.value = lexdata[t.lexpos:end]
+        t.lexer.lexpos = end
         t.lexer.begin('peculiar')
         return t
 
-    def t_ANY_bracket(self, t):
-        r'\['
-        level = 1
-        curpos = 1
-        for c in t.lexer.lexdata[t.lexer.lexpos:]:
-            if c == '[':
-                level += 1
-            elif c == ']':
-                level -= 1
-                if level == 0:
-                    break
-            curpos += 1
+    # Characters no other rule accepts.  These are handled here rather than
+    # by the error functions, as PLY copies the rest of the input for each
+    # call to those.  They must stay the last function rules, and exclude
+    # the characters that start the codes string rules and the literals.
+    def t_INITIAL_peculiar_other(self, t):
+        r'[^A-Za-z0-9 \t:,+/\-(\[]'
+        self.errors.append('skipped %r at %d' % (t.value, t.lexpos))
 
+    def t_codes_other(self, t):
+        r'[^A-Zbdefhjmnpqsvw\s:,+/\-(\[]'
         t.type = 'PECULIARITY'
-        t.value = t.lexer.lexdata[t.lexer.lexpos-1:t.lexer.lexpos+curpos]
-        t.lexer.skip(curpos)
-        t.lexer.begin('peculiar')
         return t
 
     def t_INITIAL_peculiar_error(self, t):
+        self.errors.append('skipped %r at %d' % (t.value[0], t.lexpos))
         t.lexer.skip(1)
     
     def t_codes_error(self, t):
@@ -308,19 +391,48 @@ class SpecLexer(object):
 
 class SpecParser(object):
 
-    def __init__(self, lexer=None, **kwargs):
+    def __init__(self, lexer=None, tables=True, **kwargs):
         if lexer is None:
-            self.lexer = SpecLexer().lexer
+            lexer = SpecLexer(tables=tables)
+        if isinstance(lexer, SpecLexer):
+            self.speclexer = lexer
+            self.lexer = lexer.lexer
         else:
-            if isinstance(lexer, SpecLexer):
-                self.lexer = lexer.lexer
-            else:
-                self.lexer = lexer
-        self.parser = yacc.yacc(module=self, **kwargs)
+            # a bare PLY lexer, whose skipped characters can't be reported
+            self.speclexer = None
+            self.lexer = lexer
+
+        # messages from the last parse, and parse_many path counts
+        self.errors = []
+        self.fast_parses = 0
+        self.full_parses = 0
+
+        self.parser = None
+        if tables:
+            parsetab = _load_tables(PARSETAB)
+            if parsetab is not None:
+                # tables from another PLY version are rebuilt like stale ones
+                try:
+                    lr = yacc.LRTable()
+                    lr.read_table(parsetab)
+                    lr.bind_callables(_bound_methods(self, 'p_'))
+                    self.parser = yacc.LRParser(lr, self.p_error)
+                except yacc.VersionError:
+                    pass
+        if self.parser is None:
+            # build the tables in memory rather than writing them out
+            kwargs.setdefault('debug', False)
+            kwargs.setdefault('write_tables', False)
+            self.parser = yacc.yacc(module=self, **kwargs)
     
     tokens = SpecLexer.tokens
     literals = SpecLexer.literals
 
+    # Plain MK types such as K0III, B9.5V or G8III-IV, which the grammar
+    # reduces to just a temperature class, subclass and luminosity class
+    canonical = re.compile(r'([OBAFGKM])(\d+(\.\d*)?)?'
+                           r'([IVX]+[abz]*([\-/][IVX]+[abz]*)?)?\Z')
+
     phrases = {
         'delta': {'Del'},
         'lambda': {'Boo'},
@@ -338,32 +450,25 @@ class SpecParser(object):
     
     def p_spectrum_peculiar(self, p):
         '''spectrum : core peculiarities'''
-        p[0] = p[1]
-        p[0].pecs += p[2]
+        p[0] = p[1].add_pecs(*p[2])
     
     def p_spectrum_comp(self, p):
         '''spectrum : core '+' core
                     | core '+' core peculiarities'''
-        p[0] = p[1]
-        p[0].comp = p[3].tclass
+        p[0] = p[1].replace(comp=p[3].tclass)
     
     def p_spectrum_compellipsis(self, p):
         '''spectrum : core '+' ELLIPSIS'''
-        p[0] = p[1]
-        p[0].comp = '?'
+        p[0] = p[1].replace(comp='?')
     
     def p_spectrum_peculiarcomp(self, p):
         '''spectrum : core peculiarities '+' core
                     | core peculiarities '+' core peculiarities'''
-        p[0] = p[1]
-        p[0].pecs += p[2]
-        p[0].comp = p[4].tclass
+        p[0] = p[1].replace(pecs=p[1].pecs + tuple(p[2]), comp=p[4].tclass)
     
     def p_spectrum_peculiarcompellipsis(self, p):
         '''spectrum : core peculiarities '+' ELLIPSIS'''
-        p[0] = p[1]
-        p[0].pecs += p[2]
-        p[0].comp = '?'
+        p[0] = p[1].replace(pecs=p[1].pecs + tuple(p[2]), comp='?')
 
     def p_core_lprefixtemp(self, p):
         '''core : lprefixtemp'''
@@ -373,7 +478,7 @@ class SpecParser(object):
         '''core : lprefixtemp ROMAN'''
         p[0] = p[1]
         if p[1].comp is None:
-            p[0].lclass = p[2]
+            p[0] = p[0].replace(lclass=p[2])
     
     def p_core_special(self, p):
         '''core : special'''
@@ -391,30 +496,25 @@ class SpecParser(object):
             keys.remove('He')
 
         if keys == {'h','k','m'}:
-            p[0] = p[1]['h']
-            p[0].pecs.append(('m', ''))
+            p[0] = p[1]['h'].add_pecs(('m', ''))
         elif keys == {'h','m'}:
-            p[0] = p[1]['h']
             if p[1]['m'].earlier_than(p[1]['h']):
-                p[0].pecs.append(('m', '-'))
+                p[0] = p[1]['h'].add_pecs(('m', '-'))
             else:
-                p[0].pecs.append(('m', ''))
+                p[0] = p[1]['h'].add_pecs(('m', ''))
         elif keys in ({'h','g','m'},{'h','g','k','m'}):
-            p[0] = p[1]['h']
             if (p[1]['m'].earlier_than(p[1]['h']) or
                     p[1]['m'].earlier_than(p[1]['g'])):
-                p[0].pecs.append(('m', '-'))
+                p[0] = p[1]['h'].add_pecs(('m', '-'))
             else:
-                p[0].pecs.append(('m', ''))
+                p[0] = p[1]['h'].add_pecs(('m', ''))
         elif keys == {'k','h'}:
-            p[0] = p[1]['h']
             if p[1]['k'].later_than(p[1]['h']):
-                p[0].pecs.append(('m', '+'))
+                p[0] = p[1]['h'].add_pecs(('m', '+'))
             else:
-                p[0].pecs.append(('m', '-'))
+                p[0] = p[1]['h'].add_pecs(('m', '-'))
         elif keys == {'k','m'}:
-            p[0] = p[1]['k']
-            p[0].pecs.append(('m', ''))
+            p[0] = p[1]['k'].add_pecs(('m', ''))
         elif len(keys) == 1 and p[1].keys()[0] in {'h','k'}:
             p[0] = p[1].values()[0]
         else:
@@ -422,25 +522,25 @@ class SpecParser(object):
             return
         
         if has_He:
-            p[0].pecs.append(('He', ''))
+            p[0] = p[0].add_pecs(('He', ''))
         
-        if p[0].lclass is None:
-            p[0].lclass = p[1]['lclass']
+        lclass = p[0].lclass
+        if lclass is None:
+            lclass = p[1]['lclass']
             
-        p[0].comp = comp
+        p[0] = p[0].replace(lclass=lclass, comp=comp)
 
     def p_core_lprefixspecial(self, p):
         '''core : lprefixtemp special'''
         p[0] = p[1]
         if 'm' in p[2]:
-            p[0].pecs.append(('m', ''))
+            p[0] = p[0].add_pecs(('m', ''))
     
     def p_core_lprefixromanspecial(self, p):
         '''core : lprefixtemp ROMAN special'''
-        p[0] = p[1]
-        p[0].lclass = p[2]
+        p[0] = p[1].replace(lclass=p[2])
         if 'm' in p[3]:
-            p[0].pecs.append(('m', ''))
+            p[0] = p[0].add_pecs(('m', ''))
 
     def p_lprefixtemp_tempclass(self, p):
         '''lprefixtemp : tempclass'''
@@ -455,24 +555,21 @@ class SpecParser(object):
 
     def p_lprefixtemp_lprefixsubclass(self, p):
         '''lprefixtemp : LPREFIX tempclass'''
-        p[0] = p[2]
         if (p[1] == 'sd' and
                 p[2].tclass in ('O','ON','OC','OB','B','BN','BC','A')):
-            p[0].tclass = 'sd'+p[2].tclass
+            p[0] = p[2].replace(tclass='sd'+p[2].tclass)
         elif p[1] == 'sd' and p[2].tclass in ('A','F','G','K'):
-            p[0].pecs.append(('Fe','-'))
-            p[0].lclass = p[1]
+            p[0] = p[2].add_pecs(('Fe','-')).replace(lclass=p[1])
         elif (p[1] in ('sd', 'esd', 'usd') and
                 p[2].tclass in ('M','L','T','Y')):
-            p[0].pecs.append((p[1], ''))
+            p[0] = p[2].add_pecs((p[1], ''))
             if p[1] != 'esd':
-                p[0].lclass = p[1]
+                p[0] = p[0].replace(lclass=p[1])
         elif (p[1] == 'd'
               and p[2].tclass in ('C','C-R','C-N','C-J','C-H','C-Hd','R','N')):
-            p[0].pecs.append(('d',''))
-            p[0].lclass = p[1]
+            p[0] = p[2].add_pecs(('d','')).replace(lclass=p[1])
         else:
-            p[0].lclass = p[1]
+            p[0] = p[2].replace(lclass=p[1])
 
     def p_special_single(self, p):
         '''special : sprefixtemp'''
@@ -495,9 +592,7 @@ class SpecParser(object):
     
     def p_sprefixtemp_roman(self, p):
         '''sprefixtemp : SPREFIX tempclass ROMAN'''
-        info = p[2]
-        info.lclass = p[3]
-        p[0] = (p[1], info)
+        p[0] = (p[1], p[2].replace(lclass=p[3]))
     
     def p_tempclass_tclass(self, p):
         '''tempclass : TCLASS
@@ -508,9 +603,10 @@ class SpecParser(object):
     
     def p_tempclass_subclass(self, p):
         '''tempclass : TCLASS numbers'''
-        p[0] = SpecInfo(tclass=p[1], subclass=p[2]['n'])
+        pecs = ()
         if '/' in p[2]:
-            p[0].pecs.append(('/',str(p[2]['/'])))
+            pecs = (('/',str(p[2]['/'])),)
+        p[0] = SpecInfo(tclass=p[1], subclass=p[2]['n'], pecs=pecs)
 
     def p_tempclass_rangetemp(self, p):
         '''tempclass : TCLASS numbers TCLASS
@@ -519,23 +615,25 @@ class SpecParser(object):
                      | TCLASS numbers TCLASS numbers TCLASS numbers
                      | TCLASS numbers TCLASS numbers TCLASS numbers TCLASS
                      | TCLASS numbers TCLASS numbers TCLASS numbers TCLASS numbers'''
-        p[0] = SpecInfo(tclass=p[1], subclass=p[2]['n'])
-        has_slash = False
+        pecs = ()
+        comp = None
         for i in (x*2+2 for x in range((len(p)-1) // 2)):
-            if '/' in p[i] and not has_slash:
-                p[0].pecs.append(('/', str(p[i]['/'])))
-                has_slash = True
+            if '/' in p[i] and not pecs:
+                pecs = (('/', str(p[i]['/'])),)
             if p[i]['end'] == '+':
-                p[0].comp = p[i+1]
+                comp = p[i+1]
                 break
+        p[0] = SpecInfo(tclass=p[1], subclass=p[2]['n'], pecs=pecs, comp=comp)
 
     def p_tempclass_ellipsis(self, p):
         '''tempclass : TCLASS numbers ELLIPSIS'''
-        p[0] = SpecInfo(tclass=p[1], subclass=p[2]['n'])
+        pecs = ()
         if '/' in p[2]:
-            p[0].pecs.append(('/', str(p[2]['/'])))
+            pecs = (('/', str(p[2]['/'])),)
+        comp = None
         if p[2]['end'] == '+':
-            p[0].comp = '?'
+            comp = '?'
+        p[0] = SpecInfo(tclass=p[1], subclass=p[2]['n'], pecs=pecs, comp=comp)
 
     def p_tempclass_ms(self, p):
         '''tempclass : TCLASS numbers MS
@@ -582,6 +680,7 @@ class SpecParser(object):
     
     def p_peculiarities_multi(self, p):
         '''peculiarities : peculiarities peculiarity'''
+        # a list while it grows, so appending stays O(1)
         p[0] = p[1]
         if p[1][-1][1] == '' and p[2][1] == '':
             nextwords = SpecParser.phrases.get(p[1][-1][0], set())
@@ -640,9 +739,64 @@ class SpecParser(object):
 
     def p_error(self, p):
         if p:
+            self.errors.append('unexpected %r at %d' % (p.value, p.lexpos))
             self.parser.errok()
+        else:
+            self.errors.append('unexpected end of input')
 
     def parse(self, data, **kwargs):
+        # The errors reported while parsing are left in self.errors
+        kwargs.setdefault('lexer', self.lexer)
+        self.errors = []
+        if self.speclexer is not None:
+            self.speclexer.errors = []
         result = self.parser.parse(data, **kwargs)
+        if self.speclexer is not None and self.speclexer.errors:
+            self.errors = self.speclexer.errors + self.errors
         return result
+
+    def parse_many(self, sptypes, unique=False, canonical=True):
+        # Yields (SpecInfo, errors) for each string in turn.  errors is a
+        # tuple of messages, empty when the string was read cleanly;
+        # otherwise the SpecInfo is partial or None.  Plain MK types take
+        # the parse_canonical fast path unless canonical is False, and
+        # with unique, repeated strings are only parsed once.
+        results = {}
+        parse = self.parse
+        parse_canonical = SpecParser.parse_canonical
+        for sptype in sptypes:
+            if unique:
+                result = results.get(sptype)
+                if result is not None:
+                    yield result
+                    continue
+
+            specinfo = parse_canonical(sptype) if canonical else None
+            if specinfo is not None:
+                self.fast_parses += 1
+                result = (specinfo, ())
+            else:
+                self.full_parses += 1
+                specinfo = parse(sptype)
+                result = (specinfo, tuple(self.errors))
+
+            if unique:
+                results[sptype] = result
+            yield result
+
+    @staticmethod
+    def parse_canonical(data):
+        match = SpecParser.canonical.match(data)
+        if match is None:
+            return None
+
+        tclass, subclass, _, lclass, _ = match.groups()
+        if subclass is not None:
+            subclass = float(subclass)
+        if lclass is not None:
+            lclass = lclass.replace('/', '-')
+        return SpecInfo(tclass=tclass, subclass=subclass, lclass=lclass)
 #end class SpecParser
+
+if __name__ == '__main__':
+    build_tables()
@@ -0,0 +1,93 @@
+
+# specparsetab.py
+# This file is automatically generated. Do not edit.
+_tabversion = '3.8'
+
+_lr_method = 'LALR'
+
+_lr_signature = 'D5961D966E719C926BBBC0CF0C89C5A9'
+    
+_lr_action_items = {'NUMMINUS':([12,15,21,],[28,35,40,]),'WORD':([1,2,4,6,7,8,9,10,11,12,13,14,15,16,17,18,19,20,21,23,24,26,27,28,29,30,31,32,33,34,35,36,37,38,39,40,41,43,45,46,47,48,49,50,51,53,54,55,56,59,62,63,64,67,68,69,70,71,72,75,76,79,80,81,82,83,],[10,-17,-11,-19,-23,-16,-13,-59,10,-58,-51,10,-57,-18,-21,-12,-14,-24,-39,-27,-20,10,10,-62,-63,10,10,10,10,-52,-60,-61,-22,-15,-25,-40,-41,-42,-26,-35,-34,-28,10,10,-56,10,-54,-55,-53,-44,-43,-45,-46,-29,10,-49,-47,-50,-48,-30,-36,-31,-37,-38,-32,-33,]),'LPREFIX':([0,11,30,],[2,2,2,]),'SPREFIX':([0,2,4,6,7,8,9,11,16,17,18,19,20,21,23,24,30,37,38,39,40,41,43,45,46,47,48,59,62,63,64,67,69,70,71,72,75,76,79,80,81,82,83,],[3,-17,3,-19,-23,-16,3,3,-18,-21,3,3,-24,-39,-27,-20,3,-22,3,-25,-40,-41,-42,-26,-35,-34,-28,-44,-43,-45,-46,-29,-49,-47,-50,-48,-30,-36,-31,-37,-38,-32,-33,]),'+':([1,2,4,6,7,8,9,10,12,13,14,15,16,17,18,19,20,21,23,24,27,28,29,34,35,36,37,38,39,40,41,43,45,46,47,48,49,51,54,55,56,59,62,63,64,67,68,69,70,71,72,75,76,79,80,81,82,83,],[11,-17,-11,-19,-23,-16,-13,-59,-58,-51,30,-57,-18,-21,-12,-14,-24,-39,-27,-20,50,-62,-63,-52,-60,-61,-22,-15,-25,-40,-41,-42,-26,-35,-34,-28,50,-56,-54,-55,-53,-44,-43,-45,-46,-29,50,-49,-47,-50,-48,-30,-36,-31,-37,-38,-32,-33,]),'NUMPLUS':([12,15,21,],[29,36,41,]),'-':([7,10,12,13,14,15,21,27,28,29,34,35,36,46,49,51,54,55,56,68,],[20,-59,-58,-51,31,-57,42,31,-62,-63,-52,-60,-61,65,31,-56,-54,-55,-53,31,]),'NUMBER':([7,40,42,43,44,48,57,58,60,61,73,74,75,82,],[21,21,21,21,21,21,21,21,21,21,21,21,21,21,]),'/':([7,10,12,13,14,15,21,27,28,29,34,35,36,40,41,46,49,51,54,55,56,68,],[22,-59,-58,-51,33,-57,43,33,-62,-63,-52,-60,-61,58,61,66,33,-56,-54,-55,-53,33,]),'ELEMENT':([1,2,4,6,7,8,9,10,11,12,13,14,15,16,17,18,19,20,21,23,24,26,27,28,29,30,31,32,33,34,35,36,37,38,39,40,41,43,45,46,47,48,49,50,51,53,54,55,56,59,62,63,64,67,68,69,70,71,72,75,76,79,80,81,82,83,],[12,-17,-11,-19,-23,-16,-13,-59,12,-58,-51,12,-57,-18,-21,-12,-14,-24,-39,-27,-20,12,12,-62,-63,12,12,12,12,-52,-60,-61,-22,-15,-25,-40,-41,-42,-26,-35,-34,-28,12,12,-56,12,-54,-55,-53,-44,-43,-45,-46,-29,12,-49,-47,-50,-48,-30,-36,-31,-37,-38,-32,-33,]),'PECULIARITY':([1,2,4,6,7,8,9,10,11,12,13,14,15,16,17,18,19,20,21,23,24,26,27,28,29,30,31,32,33,34,35,36,37,38,39,40,41,43,45,46,47,48,49,50,51,53,54,55,56,59,62,63,64,67,68,69,70,71,72,75,76,79,80,81,82,83,],[15,-17,-11,-19,-23,-16,-13,-59,15,-58,-51,15,-57,-18,-21,-12,-14,-24,-39,-27,-20,15,15,-62,-63,15,15,15,15,-52,-60,-61,-22,-15,-25,-40,-41,-42,-26,-35,-34,-28,15,15,-56,15,-54,-55,-53,-44,-43,-45,-46,-29,15,-49,-47,-50,-48,-30,-36,-31,-37,-38,-32,-33,]),'ROMAN':([2,4,7,8,16,17,20,21,23,39,40,41,43,45,46,47,48,59,62,63,64,67,69,70,71,72,75,76,79,80,81,82,83,],[-17,18,-23,-16,-18,37,-24,-39,-27,-25,-40,-41,-42,-26,-35,-34,-28,-44,-43,-45,-46,-29,-49,-47,-50,-48,-30,-36,-31,-37,-38,-32,-33,]),'MS':([21,23,40,41,43,59,62,63,64,67,69,70,71,72,77,78,],[-39,46,-40,-41,-42,-44,-43,-45,-46,76,-49,-47,-50,-48,80,81,]),'ELLIPSIS':([11,21,23,30,40,41,43,59,62,63,64,69,70,71,72,],[25,-39,47,52,-40,-41,-42,-44,-43,-45,-46,-49,-47,-50,-48,]),'TCLASS':([0,2,3,11,20,21,22,23,30,40,41,43,59,62,63,64,65,66,67,69,70,71,72,79,],[7,7,7,7,39,-39,45,48,7,-40,-41,-42,-44,-43,-45,-46,73,74,75,-49,-47,-50,-48,82,]),',':([10,12,13,14,15,21,27,28,29,34,35,36,40,41,49,51,54,55,56,68,],[-59,-58,-51,32,-57,44,32,-62,-63,-52,-60,-61,57,60,32,-56,-54,-55,-53,32,]),'$end':([1,2,4,5,6,7,8,9,10,11,12,13,14,15,16,17,18,19,20,21,23,24,25,26,27,28,29,34,35,36,37,38,39,40,41,43,45,46,47,48,49,51,52,53,54,55,56,59,62,63,64,67,68,69,70,71,72,75,76,79,80,81,82,83,],[-1,-17,-11,0,-19,-23,-16,-13,-59,-2,-58,-51,-4,-57,-18,-21,-12,-14,-24,-39,-27,-20,-7,-5,-3,-62,-63,-52,-60,-61,-22,-15,-25,-40,-41,-42,-26,-35,-34,-28,-6,-56,-10,-8,-54,-55,-53,-44,-43,-45,-46,-29,-9,-49,-47,-50,-48,-30,-36,-31,-37,-38,-32,-33,]),}
+
+_lr_action = {}
+for _k, _v in _lr_action_items.items():
+   for _x,_y in zip(_v[0],_v[1]):
+      if not _x in _lr_action:  _lr_action[_x] = {}
+      _lr_action[_x][_k] = _y
+del _lr_action_items
+
+_lr_goto_items = {'core':([0,11,30,],[1,26,53,]),'lprefixtemp':([0,11,30,],[4,4,4,]),'spectrum':([0,],[5,]),'sprefixtemp':([0,4,9,11,18,19,30,38,],[6,6,24,6,6,24,6,24,]),'peculiarity':([1,11,14,26,27,30,31,32,33,49,50,53,68,],[13,13,34,13,34,51,54,55,56,34,51,13,34,]),'peculiarities':([1,11,26,53,],[14,27,49,68,]),'numbers':([7,40,42,43,44,48,57,58,60,61,73,74,75,82,],[23,59,62,63,64,67,69,70,71,72,77,78,79,83,]),'tempclass':([0,2,3,11,30,],[8,16,17,8,8,]),'special':([0,4,11,18,30,],[9,19,9,38,9,]),}
+
+_lr_goto = {}
+for _k, _v in _lr_goto_items.items():
+   for _x, _y in zip(_v[0], _v[1]):
+       if not _x in _lr_goto: _lr_goto[_x] = {}
+       _lr_goto[_x][_k] = _y
+del _lr_goto_items
+_lr_productions = [
+  ("S' -> spectrum","S'",1,None,None,None),
+  ('spectrum -> core','spectrum',1,'p_spectrum_core','specparse.py',446),
+  ('spectrum -> core +','spectrum',2,'p_spectrum_core','specparse.py',447),
+  ('spectrum -> core + peculiarities','spectrum',3,'p_spectrum_core','specparse.py',448),
+  ('spectrum -> core peculiarities','spectrum',2,'p_spectrum_peculiar','specparse.py',452),
+  ('spectrum -> core + core','spectrum',3,'p_spectrum_comp','specparse.py',456),
+  ('spectrum -> core + core peculiarities','spectrum',4,'p_spectrum_comp','specparse.py',457),
+  ('spectrum -> core + ELLIPSIS','spectrum',3,'p_spectrum_compellipsis','specparse.py',461),
+  ('spectrum -> core peculiarities + core','spectrum',4,'p_spectrum_peculiarcomp','specparse.py',465),
+  ('spectrum -> core peculiarities + core peculiarities','spectrum',5,'p_spectrum_peculiarcomp','specparse.py',466),
+  ('spectrum -> core peculiarities + ELLIPSIS','spectrum',4,'p_spectrum_peculiarcompellipsis','specparse.py',470),
+  ('core -> lprefixtemp','core',1,'p_core_lprefixtemp','specparse.py',474),
+  ('core -> lprefixtemp ROMAN','core',2,'p_core_luminosity','specparse.py',478),
+  ('core -> special','core',1,'p_core_special','specparse.py',484),
+  ('core -> lprefixtemp special','core',2,'p_core_lprefixspecial','specparse.py',534),
+  ('core -> lprefixtemp ROMAN special','core',3,'p_core_lprefixromanspecial','specparse.py',540),
+  ('lprefixtemp -> tempclass','lprefixtemp',1,'p_lprefixtemp_tempclass','specparse.py',546),
+  ('lprefixtemp -> LPREFIX','lprefixtemp',1,'p_lprefixtemp_lprefixonly','specparse.py',550),
+  ('lprefixtemp -> LPREFIX tempclass','lprefixtemp',2,'p_lprefixtemp_lprefixsubclass','specparse.py',557),
+  ('special -> sprefixtemp','special',1,'p_special_single','specparse.py',575),
+  ('special -> special sprefixtemp','special',2,'p_special_multi','specparse.py',581),
+  ('sprefixtemp -> SPREFIX tempclass','sprefixtemp',2,'p_sprefixtemp_tempclass','specparse.py',590),
+  ('sprefixtemp -> SPREFIX tempclass ROMAN','sprefixtemp',3,'p_sprefixtemp_roman','specparse.py',594),
+  ('tempclass -> TCLASS','tempclass',1,'p_tempclass_tclass','specparse.py',598),
+  ('tempclass -> TCLASS -','tempclass',2,'p_tempclass_tclass','specparse.py',599),
+  ('tempclass -> TCLASS - TCLASS','tempclass',3,'p_tempclass_tclass','specparse.py',600),
+  ('tempclass -> TCLASS / TCLASS','tempclass',3,'p_tempclass_tclass','specparse.py',601),
+  ('tempclass -> TCLASS numbers','tempclass',2,'p_tempclass_subclass','specparse.py',605),
+  ('tempclass -> TCLASS numbers TCLASS','tempclass',3,'p_tempclass_rangetemp','specparse.py',612),
+  ('tempclass -> TCLASS numbers TCLASS numbers','tempclass',4,'p_tempclass_rangetemp','specparse.py',613),
+  ('tempclass -> TCLASS numbers TCLASS numbers TCLASS','tempclass',5,'p_tempclass_rangetemp','specparse.py',614),
+  ('tempclass -> TCLASS numbers TCLASS numbers TCLASS numbers','tempclass',6,'p_tempclass_rangetemp','specparse.py',615),
+  ('tempclass -> TCLASS numbers TCLASS numbers TCLASS numbers TCLASS','tempclass',7,'p_tempclass_rangetemp','specparse.py',616),
+  ('tempclass -> TCLASS numbers TCLASS numbers TCLASS numbers TCLASS numbers','tempclass',8,'p_tempclass_rangetemp','specparse.py',617),
+  ('tempclass -> TCLASS numbers ELLIPSIS','tempclass',3,'p_tempclass_ellipsis','specparse.py',629),
+  ('tempclass -> TCLASS numbers MS','tempclass',3,'p_tempclass_ms','specparse.py',639),
+  ('tempclass -> TCLASS numbers TCLASS numbers MS','tempclass',5,'p_tempclass_ms','specparse.py',640),
+  ('tempclass -> TCLASS numbers MS - TCLASS numbers MS','tempclass',7,'p_tempclass_ms','specparse.py',641),
+  ('tempclass -> TCLASS numbers MS / TCLASS numbers MS','tempclass',7,'p_tempclass_ms','specparse.py',642),
+  ('numbers -> NUMBER','numbers',1,'p_numbers_single','specparse.py',646),
+  ('numbers -> NUMBER NUMMINUS','numbers',2,'p_numbers_open','specparse.py',650),
+  ('numbers -> NUMBER NUMPLUS','numbers',2,'p_numbers_open','specparse.py',651),
+  ('numbers -> NUMBER /','numbers',2,'p_numbers_open','specparse.py',652),
+  ('numbers -> NUMBER - numbers','numbers',3,'p_numbers_multi','specparse.py',656),
+  ('numbers -> NUMBER NUMMINUS numbers','numbers',3,'p_numbers_multi','specparse.py',657),
+  ('numbers -> NUMBER / numbers','numbers',3,'p_numbers_multi','specparse.py',658),
+  ('numbers -> NUMBER , numbers','numbers',3,'p_numbers_multi','specparse.py',659),
+  ('numbers -> NUMBER NUMMINUS / numbers','numbers',4,'p_numbers_openmulti','specparse.py',667),
+  ('numbers -> NUMBER NUMPLUS / numbers','numbers',4,'p_numbers_openmulti','specparse.py',668),
+  ('numbers -> NUMBER NUMMINUS , numbers','numbers',4,'p_numbers_openmulti','specparse.py',669),
+  ('numbers -> NUMBER NUMPLUS , numbers','numbers',4,'p_numbers_openmulti','specparse.py',670),
+  ('peculiarities -> peculiarity','peculiarities',1,'p_peculiarities_single','specparse.py',678),
+  ('peculiarities -> peculiarities peculiarity','peculiarities',2,'p_peculiarities_multi','specparse.py',682),
+  ('peculiarities -> peculiarities / peculiarity','peculiarities',3,'p_peculiarities_split','specparse.py',694),
+  ('peculiarities -> peculiarities - peculiarity','peculiarities',3,'p_peculiarities_split','specparse.py',695),
+  ('peculiarities -> peculiarities , peculiarity','peculiarities',3,'p_peculiarities_split','specparse.py',696),
+  ('peculiarities -> peculiarities + peculiarity','peculiarities',3,'p_peculiarities_split','specparse.py',697),
+  ('peculiarity -> PECULIARITY','peculiarity',1,'p_peculiarity','specparse.py',702),
+  ('peculiarity -> ELEMENT','peculiarity',1,'p_peculiarity','specparse.py',703),
+  ('peculiarity -> WORD','peculiarity',1,'p_peculiarity_word','specparse.py',718),
+  ('peculiarity -> PECULIARITY NUMMINUS','peculiarity',2,'p_peculiarity_plusminus','specparse.py',722),
+  ('peculiarity -> PECULIARITY NUMPLUS','peculiarity',2,'p_peculiarity_plusminus','specparse.py',723),
+  ('peculiarity -> ELEMENT NUMMINUS','peculiarity',2,'p_peculiarity_plusminus','specparse.py',724),
+  ('peculiarity -> ELEMENT NUMPLUS','peculiarity',2,'p_peculiarity_plusminus','specparse.py',725),
+]
+_specdigest = '3afcd01ee880dc5420ee8457d6d4d7c559925126'
@@ -0,0 +1,227 @@
+#!/usr/bin/python
+#
+# staroctree.py: Magnitude-biased octree over stars.dat positions
+# Copyright (C) 2016  Andrew Tribick
+#
+# This program is free software; you can redistribute it and/or
+# modify it under the terms of the GNU General Public License
+# as published by the Free Software Foundation; either version 2
+# of the License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston,
+# MA  02110-1301, USA.
+
+from __future__ import print_function
+from __future__ import division
+from builtins import range
+
+import os
+import struct
+from collections import deque
+
+import numpy as np
+
+from starsdat import (STAR_DTYPE, VERSION, absolute_magnitudes, checksum,
+                      open_stars)
+
+OCTREE_MAGIC = b'CELSTOCT'
+OCTREE_HEADER_FORMAT = '<8sHHLLL'
+OCTREE_HEADER_SIZE = struct.calcsize(OCTREE_HEADER_FORMAT)
+OCTREE_SUFFIX = '.oct'
+
+# As in Celestia, a node keeps the stars brighter than its exclusion
+# magnitude and only splits once it holds more than SPLIT_THRESHOLD
+# stars.  Each level down the exclusion magnitude is that of a star a
+# quarter as luminous.
+ROOT_MAGNITUDE = 6.0
+MAGNITUDE_DECAY = 2.5 * np.log10(4)
+SPLIT_THRESHOLD = 75
+MAX_DEPTH = 24
+
+NODE_DTYPE = np.dtype([
+    ('center', '<f4', (3,)),
+    ('half', '<f4'),
+    ('magnitude', '<f4'),
+    ('children', '<i4'),
+    ('start', '<i4'),
+    ('count', '<i4'),
+])
+
+def _stars_checksum(stars):
+    # the octree depends on the positions, magnitudes and order of the
+    # records, so the whole of each record is checked
+    return checksum(np.asarray(stars, dtype=STAR_DTYPE))
+
+def _positions(stars):
+    return np.column_stack((stars['x'], stars['y'], stars['z'])).astype(np.float64)
+
+class StarOctree(object):
+    def __init__(self, stars, nodes, records):
+        self.stars = stars
+        self.nodes = nodes
+        self.records = records
+
+    @staticmethod
+    def build(stars, split_threshold=SPLIT_THRESHOLD,
+              root_magnitude=ROOT_MAGNITUDE):
+        positions = _positions(stars)
+        absmag = absolute_magnitudes(stars)
+
+        if len(positions):
+            lo = positions.min(axis=0)
+            hi = positions.max(axis=0)
+        else:
+            lo = hi = np.zeros(3)
+        center = (lo + hi) / 2
+        half = max((hi - lo).max() / 2 * 1.0001, 1e-3)
+
+        nodes = []
+        records = []
+        # breadth first, so the eight children of a node are contiguous
+        queue = deque([(np.arange(len(positions)), center, half,
+                        root_magnitude, 0)])
+        while queue:
+            members, center, half, magnitude, depth = queue.popleft()
+            node = [center, half, magnitude, -1, len(records), 0]
+            nodes.append(node)
+
+            if len(members) <= split_threshold or depth == MAX_DEPTH:
+                records.extend(members)
+                node[5] = len(members)
+                continue
+
+            # a crowded node keeps only its brightest stars, lowering its
+            # limit so that everything below it stays fainter
+            limit = magnitude
+            if np.count_nonzero(absmag[members] < limit) >= split_threshold:
+                limit = np.partition(absmag[members], split_threshold - 1)[
+                    split_threshold - 1]
+            node[2] = limit
+            bright = absmag[members] < limit
+            records.extend(members[bright])
+            node[5] = np.count_nonzero(bright)
+            members = members[~bright]
+            if not len(members):
+                continue
+
+            octant = ((positions[members] >= center) *
+                      np.array((1, 2, 4))).sum(axis=1)
+            node[3] = len(nodes) + len(queue)
+            for child in range(8):
+                offset = np.array(((child & 1) * 2 - 1,
+                                   (child >> 1 & 1) * 2 - 1,
+                                   (child >> 2 & 1) * 2 - 1)) * (half / 2)
+                queue.append((members[octant == child], center + offset,
+                              half / 2, magnitude + MAGNITUDE_DECAY,
+                              depth + 1))
+
+        table = np.empty(len(nodes), dtype=NODE_DTYPE)
+        for i, (center, half, magnitude, children, start, count) in enumerate(nodes):
+            table[i] = (center, half, magnitude, children, start, count)
+        return StarOctree(stars, table, np.array(records, dtype='<i4'))
+
+    def write(self, filename):
+        with open(filename, 'wb') as f:
+            f.write(struct.pack(OCTREE_HEADER_FORMAT, OCTREE_MAGIC, VERSION,
+                                0, len(self.nodes), len(self.records),
+                                _stars_checksum(self.stars)))
+            f.write(self.nodes.tobytes())
+            f.write(self.records.tobytes())
+
+    @staticmethod
+    def read(stars, filename):
+        with open(filename, 'rb') as f:
+            header = f.read(OCTREE_HEADER_SIZE)
+        if len(header) != OCTREE_HEADER_SIZE:
+            raise ValueError('%s: truncated header' % filename)
+        magic, version, _, nodecount, count, crc = struct.unpack(
+            OCTREE_HEADER_FORMAT, header)
+        if magic != OCTREE_MAGIC or version != VERSION:
+            raise ValueError('%s: not a star octree' % filename)
+        if count != len(stars):
+            raise ValueError('%s: built for %d stars, not %d' %
+                             (filename, count, len(stars)))
+        if crc != _stars_checksum(stars):
+            raise ValueError('%s: built for different star records' %
+                             filename)
+        nodesize = nodecount * NODE_DTYPE.itemsize
+        if os.path.getsize(filename) != OCTREE_HEADER_SIZE + nodesize + count*4:
+            raise ValueError('%s: size does not match the header' % filename)
+
+        nodes = np.memmap(filename, dtype=NODE_DTYPE, mode='r',
+                          offset=OCTREE_HEADER_SIZE, shape=(nodecount,))
+        records = np.empty(0, dtype='<i4')
+        if count:
+            records = np.memmap(filename, dtype='<i4', mode='r',
+                                offset=OCTREE_HEADER_SIZE + nodesize,
+                                shape=(count,))
+        return StarOctree(stars, nodes, records)
+
+    def _query(self, node_overlaps, star_inside, max_absmag):
+        # Visit the nodes that overlap the region, then test their stars
+        ranges = []
+        stack = [0] if len(self.nodes) else []
+        while stack:
+            node = self.nodes[stack.pop()]
+            if not node_overlaps(node['center'], node['half']):
+                continue
+            if node['count']:
+                ranges.append((node['start'], node['start'] + node['count']))
+            # stars below a node are fainter than its exclusion magnitude
+            if node['children'] >= 0 and (max_absmag is None or
+                                          max_absmag >= node['magnitude']):
+                stack.extend(range(node['children'], node['children'] + 8))
+
+        if not ranges:
+            return np.empty(0, dtype=np.int64)
+
+        candidates = np.concatenate([self.records[a:b] for a, b in ranges])
+        candidates.sort()
+        selected = self.stars[candidates]
+        inside = star_inside(_positions(selected))
+        if max_absmag is not None:
+            inside &= absolute_magnitudes(selected) <= max_absmag
+        return candidates[inside].astype(np.int64)
+
+    def query_sphere(self, center, radius, max_absmag=None):
+        # Record numbers of the stars within radius of center
+        center = np.asarray(center, dtype=np.float64)
+
+        def node_overlaps(node_center, half):
+            nearest = np.clip(center, node_center - half, node_center + half)
+            return ((nearest - center)**2).sum() <= radius**2
+
+        def star_inside(positions):
+            return ((positions - center)**2).sum(axis=1) <= radius**2
+
+        return self._query(node_overlaps, star_inside, max_absmag)
+
+    def query_box(self, lo, hi, max_absmag=None):
+        # Record numbers of the stars with lo <= position <= hi
+        lo = np.asarray(lo, dtype=np.float64)
+        hi = np.asarray(hi, dtype=np.float64)
+
+        def node_overlaps(node_center, half):
+            return ((node_center + half >= lo).all() and
+                    (node_center - half <= hi).all())
+
+        def star_inside(positions):
+            return ((positions >= lo) & (positions <= hi)).all(axis=1)
+
+        return self._query(node_overlaps, star_inside, max_absmag)
+#end class StarOctree
+
+def write_octree(filename, stars):
+    StarOctree.build(stars).write(filename)
+
+def open_octree(filename, octree_filename=None):
+    if octree_filename is None:
+        octree_filename = filename + OCTREE_SUFFIX
+    return StarOctree.read(open_stars(filename), octree_filename)
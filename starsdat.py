@@ -0,0 +1,191 @@
+#!/usr/bin/python
+#
+# starsdat.py: Read and write Celestia binary star databases
+# Copyright (C) 2016  Andrew Tribick
+#
+# This program is free software; you can redistribute it and/or
+# modify it under the terms of the GNU General Public License
+# as published by the Free Software Foundation; either version 2
+# of the License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston,
+# MA  02110-1301, USA.
+
+from __future__ import print_function
+from __future__ import division
+
+import os
+import struct
+import zlib
+
+import numpy as np
+
+MAGIC = b'CELSTARS'
+VERSION = 0x0100
+HEADER_FORMAT = '<8sHL'
+HEADER_SIZE = struct.calcsize(HEADER_FORMAT)
+
+# Matches the '<l3fhH' records written by buildstardb.py; absmag is in
+# units of 1/256 magnitude and sptype is the Celestia spectral code
+STAR_DTYPE = np.dtype([
+    ('hip', '<i4'),
+    ('x', '<f4'),
+    ('y', '<f4'),
+    ('z', '<f4'),
+    ('absmag', '<i2'),
+    ('sptype', '<u2'),
+])
+
+def read_header(filename):
+    with open(filename, 'rb') as f:
+        header = f.read(HEADER_SIZE)
+    if len(header) != HEADER_SIZE:
+        raise ValueError('%s: truncated header' % filename)
+
+    magic, version, count = struct.unpack(HEADER_FORMAT, header)
+    if magic != MAGIC:
+        raise ValueError('%s: not a Celestia star database' % filename)
+    if version != VERSION:
+        raise ValueError('%s: unsupported version 0x%04x' %
+                         (filename, version))
+
+    size = os.path.getsize(filename)
+    if size != HEADER_SIZE + count*STAR_DTYPE.itemsize:
+        raise ValueError('%s: expected %d stars but the file is %d bytes' %
+                         (filename, count, size))
+    return count
+
+def open_stars(filename, mode='r'):
+    # Returns the records as a memory-mapped structured array
+    count = read_header(filename)
+    if count == 0:
+        return np.empty(0, dtype=STAR_DTYPE)
+    return np.memmap(filename, dtype=STAR_DTYPE, mode=mode,
+                     offset=HEADER_SIZE, shape=(count,))
+
+def absolute_magnitudes(stars):
+    return stars['absmag'] / 256
+
+def checksum(values):
+    # CRC-32 of an array's little-endian bytes, which ties the files built
+    # alongside stars.dat to the records they were built from
+    return zlib.crc32(np.ascontiguousarray(values).tobytes()) & 0xffffffff
+
+def write_stars(filename, stars):
+    # written alongside and renamed, as the old file may still be mapped
+    tmpname = filename + '.tmp'
+    with open(tmpname, 'wb') as f:
+        f.write(struct.pack(HEADER_FORMAT, MAGIC, VERSION, len(stars)))
+        f.write(np.asarray(stars, dtype=STAR_DTYPE).tobytes())
+    if os.path.exists(filename):
+        os.remove(filename)
+    os.rename(tmpname, filename)
+
+INDEX_MAGIC = b'CELSTIDX'
+INDEX_HEADER_FORMAT = '<8sHHLLL'
+INDEX_HEADER_SIZE = struct.calcsize(INDEX_HEADER_FORMAT)
+INDEX_SUFFIX = '.idx'
+
+# Index layouts: a dense array of record numbers indexed by HIP, or
+# sorted HIP numbers followed by their record numbers
+DENSE_INDEX = 0
+SORTED_INDEX = 1
+
+# A dense index is used while it is at most this many times the star count
+DENSE_FACTOR = 4
+
+def write_index(filename, hips):
+    hips = np.asarray(hips, dtype=np.int64)
+    limits = np.iinfo('<i4')
+    if len(hips) and (hips.min() < limits.min or hips.max() > limits.max):
+        raise ValueError('%s: HIP numbers must fit in 32 bits' % filename)
+    unique = len(np.unique(hips)) == len(hips)
+    if (unique and len(hips) and hips.min() >= 0 and
+            hips.max() < DENSE_FACTOR*len(hips) + 1024):
+        kind = DENSE_INDEX
+        entries = np.full(int(hips.max()) + 1, -1, dtype='<i4')
+        entries[hips] = np.arange(len(hips))
+        payload = entries.tobytes()
+    else:
+        kind = SORTED_INDEX
+        order = np.argsort(hips, kind='mergesort')
+        entries = hips[order].astype('<i4')
+        payload = entries.tobytes() + order.astype('<i4').tobytes()
+
+    with open(filename, 'wb') as f:
+        f.write(struct.pack(INDEX_HEADER_FORMAT, INDEX_MAGIC, VERSION, kind,
+                            len(entries), len(hips),
+                            checksum(hips.astype('<i4'))))
+        f.write(payload)
+
+class StarIndex(object):
+    def __init__(self, stars, filename):
+        self.stars = stars
+
+        with open(filename, 'rb') as f:
+            header = f.read(INDEX_HEADER_SIZE)
+        if len(header) != INDEX_HEADER_SIZE:
+            raise ValueError('%s: truncated header' % filename)
+        magic, version, self.kind, count, starcount, crc = struct.unpack(
+            INDEX_HEADER_FORMAT, header)
+        if magic != INDEX_MAGIC or version != VERSION:
+            raise ValueError('%s: not a star index' % filename)
+        if starcount != len(stars):
+            raise ValueError('%s: built for %d stars, not %d' %
+                             (filename, starcount, len(stars)))
+        if crc != checksum(stars['hip']):
+            raise ValueError('%s: built for different HIP numbers' % filename)
+
+        arrays = 1 if self.kind == DENSE_INDEX else 2
+        if os.path.getsize(filename) != INDEX_HEADER_SIZE + arrays*count*4:
+            raise ValueError('%s: size does not match the header' % filename)
+
+        if count == 0:
+            entries = np.empty((arrays, 0), dtype='<i4')
+        else:
+            entries = np.memmap(filename, dtype='<i4', mode='r',
+                                offset=INDEX_HEADER_SIZE, shape=(arrays, count))
+        if self.kind == DENSE_INDEX:
+            self._records = entries[0]
+        else:
+            self._keys, self._records = entries
+
+    def find(self, hips):
+        # Record numbers for an array of HIP numbers, -1 where not present
+        hips = np.asarray(hips, dtype=np.int64)
+        records = np.full(hips.shape, -1, dtype=np.int64)
+        if self.kind == DENSE_INDEX:
+            inrange = (hips >= 0) & (hips < len(self._records))
+            records[inrange] = self._records[hips[inrange]]
+        elif len(self._keys):
+            pos = np.searchsorted(self._keys, hips)
+            pos[pos == len(self._keys)] = 0
+            found = self._keys[pos] == hips
+            records[found] = self._records[pos[found]]
+        return records
+
+    def lookup(self, hip):
+        record = self.find([hip])[0]
+        if record < 0:
+            return None
+        return self.stars[record]
+
+    def lookup_many(self, hips):
+        # Returns the records that were found and a mask of which HIP
+        # numbers they belong to
+        records = self.find(hips)
+        found = records >= 0
+        return self.stars[records[found]], found
+#end class StarIndex
+
+def open_index(filename, index_filename=None):
+    if index_filename is None:
+        index_filename = filename + INDEX_SUFFIX
+    return StarIndex(open_stars(filename), index_filename)
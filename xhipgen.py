@@ -0,0 +1,266 @@
+#!/usr/bin/python
+#
+# xhipgen.py: Generate synthetic catalogues in the XHIP file layout
+# Copyright (C) 2016  Andrew Tribick
+#
+# This program is free software; you can redistribute it and/or
+# modify it under the terms of the GNU General Public License
+# as published by the Free Software Foundation; either version 2
+# of the License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston,
+# MA  02110-1301, USA.
+
+from __future__ import print_function
+from __future__ import division
+from builtins import range
+
+import argparse
+import os
+
+import numpy as np
+
+CHUNK_ROWS = 1 << 18
+
+# (label, format, units, nullable, explanation); the byte positions follow
+# from the widths, with one blank between columns
+MAIN_COLUMNS = (
+    ('HIP', 'I6', '---', False, 'Hipparcos identifier'),
+    ('RAdeg', 'F12.8', 'deg', False, 'Right ascension (ICRS)'),
+    ('DEdeg', 'F12.8', 'deg', False, 'Declination (ICRS)'),
+    ('Plx', 'F7.2', 'mas', True, 'Parallax'),
+    ('e_Plx', 'F6.2', 'mas', True, 'Standard error in Plx'),
+    ('pmRA', 'F8.2', 'mas/yr', True, 'Proper motion in RA*cos(DE)'),
+    ('pmDE', 'F8.2', 'mas/yr', True, 'Proper motion in DE'),
+    ('Dist', 'F8.2', 'pc', True, 'Distance'),
+    ('SpType', 'A26', '---', True, 'Spectral type'),
+)
+
+PHOTO_COLUMNS = (
+    ('HIP', 'I6', '---', False, 'Hipparcos identifier'),
+    ('Vmag', 'F6.3', 'mag', True, 'V magnitude'),
+    ('B-V', 'F6.3', 'mag', True, 'B-V colour index'),
+)
+
+# Spectral types are assembled from independently drawn parts, weighted
+# roughly as in the Hipparcos catalogue
+TCLASSES = (('O', 0.3), ('B', 10), ('A', 17), ('F', 18), ('G', 17),
+            ('K', 28), ('M', 5), ('C', 0.2), ('S', 0.05), ('N', 0.05),
+            ('R', 0.05), ('WC', 0.02), ('WN', 0.02), ('DA', 0.03),
+            ('sdB', 0.02), ('gK', 0.1), ('dM', 0.05))
+SUBCLASSES = (('0', 18), ('1', 8), ('2', 10), ('3', 8), ('5', 14), ('6', 5),
+              ('7', 6), ('8', 9), ('9', 8), ('0.5', 2), ('1.5', 2),
+              ('2.5', 2), ('9.5', 2), ('1/2', 1), ('8/9', 1), ('', 4))
+LCLASSES = (('', 35), ('V', 30), ('III', 22), ('IV', 5), ('IV-V', 1.5),
+            ('IV/V', 0.5), ('III-IV', 1.5), ('II', 1), ('II-III', 0.5),
+            ('Ib', 0.6), ('Iab', 0.4), ('Ia', 0.3), ('IIIa', 0.4),
+            ('IIIb', 0.5), ('Vn', 0.5), ('IVs', 0.2))
+SUFFIXES = (('', 88), ('e', 1.5), ('n', 2), ('nn', 0.3), ('p', 1),
+            ('m', 0.6), (':', 0.8), ('...', 0.5), ('var', 0.3),
+            (' CN-1', 0.2), (' Ba0.5', 0.1), ('p SrCrEu', 0.2),
+            ('(e)', 0.1), ('+F5V', 0.2), ('+...', 0.2), ('shell', 0.1))
+
+# Complete types in the less regular forms the grammar has to handle
+ODD_TYPES = ('kA2hA5mA7V', 'kB9hA0VHgMn', 'C5,4', 'C6,3e', 'S3.5/2', 'S7/1e',
+             'O8V((f))', 'O6.5V((f))', 'B1Ia+', 'B5Ve(shell)', 'A0p SiCr',
+             'B9p Hg-Mn', 'G8IIIbFe-1', 'K1IIIbCN1.5Ca1', 'K0IIIb CN-1',
+             'K2III+F5V', 'A5V+F0', 'WN5+O6', 'WC7+O5-8', 'DA3.5', 'DC9',
+             'esdM3', 'M6e-M9e', 'M8III:e', 'F2/3IV/V', 'K5/M0III',
+             'G6/8III:', 'A9III-IVvar', 'M0III-IIIa', 'kA3hF0mF2', 'Am',
+             'F4Vkf2', 'C4,5J', 'K0III-IV:var', 'G5IV+A', 'DQ6', 'DZ7')
+ODD_FRACTION = 0.02
+NULL_SPTYPE = 0.04
+
+NULL_PLX = 0.003
+NULL_PM = 0.005
+NULL_VMAG = 0.005
+NULL_BV = 0.02
+
+# Fraction of stars with no row in photo.dat, which the join drops
+MISSING_PHOTO = 0.02
+
+def _layout(columns):
+    # Returns (label, start, end, format, units, nullable, explanation)
+    # tuples with 1-based inclusive byte positions
+    layout = []
+    start = 1
+    for label, fmt, units, nullable, explanation in columns:
+        width = int(fmt[1:].split('.')[0])
+        layout.append((label, start, start + width - 1, fmt, units,
+                       nullable, explanation))
+        start += width + 1
+    return layout
+
+def _hip_format(columns, maxhip):
+    # HIP numbers beyond 999999 need a wider column
+    width = max(6, len(str(maxhip)))
+    return tuple(('HIP', 'I%d' % width) + column[2:] if column[0] == 'HIP'
+                 else column for column in columns)
+
+def _printf(fmt):
+    width = fmt[1:]
+    if fmt[0] == 'I':
+        return '%' + width + 'd'
+    elif fmt[0] == 'A':
+        return '%-' + width + 's'
+    return '%' + width + 'f'
+
+def write_readme(filename, main_layout, photo_layout, rows, photo_rows):
+    rule = '-' * 80
+    lines = [
+        'V/137D       Synthetic catalogue in a reduced XHIP layout',
+        '=' * 80,
+        'File Summary:',
+        rule,
+        ' FileName    Lrecl    Records    Explanations',
+        rule,
+        'ReadMe          80          .    This file',
+        'main.dat  %9d %10d    Main catalogue' % (main_layout[-1][2], rows),
+        'photo.dat %9d %10d    Photometry' % (photo_layout[-1][2],
+                                                  photo_rows),
+        rule,
+    ]
+    for name, layout in (('main.dat', main_layout),
+                         ('photo.dat', photo_layout)):
+        lines += [
+            '',
+            'Byte-by-byte Description of file: ' + name,
+            rule,
+            '   Bytes Format Units   Label     Explanations',
+            rule,
+        ]
+        for label, start, end, fmt, units, nullable, explanation in layout:
+            lines.append('%4d-%3d  %-5s %-7s %-9s %s%s' %
+                         (start, end, fmt, units, label,
+                          '? ' if nullable else '', explanation))
+        lines.append(rule)
+    lines.append('=' * 80)
+
+    with open(filename, 'w') as f:
+        f.write('\n'.join(lines) + '\n')
+
+def _choose(rs, choices, size):
+    values = np.array([value for value, _ in choices])
+    weights = np.array([weight for _, weight in choices], dtype=np.float64)
+    return values[rs.choice(len(values), size, p=weights/weights.sum())]
+
+def spectral_types(rs, size):
+    sptypes = _choose(rs, TCLASSES, size)
+    for parts in (SUBCLASSES, LCLASSES, SUFFIXES):
+        sptypes = np.char.add(sptypes, _choose(rs, parts, size))
+    odd = rs.random_sample(size) < ODD_FRACTION
+    sptypes = sptypes.astype('S26')
+    sptypes[odd] = np.array(ODD_TYPES)[rs.randint(len(ODD_TYPES),
+                                                  size=np.count_nonzero(odd))]
+    return sptypes, rs.random_sample(size) < NULL_SPTYPE
+
+def main_values(rs, hip):
+    size = len(hip)
+    plx = rs.lognormal(np.log(5), 0.9, size) - 0.5
+    e_plx = rs.lognormal(np.log(0.9), 0.5, size)
+    null_plx = rs.random_sample(size) < NULL_PLX
+    # XHIP only gives a distance for the better parallaxes
+    has_dist = ~null_plx & (plx > 5*e_plx) & (rs.random_sample(size) < 0.9)
+    null_pm = rs.random_sample(size) < NULL_PM
+    sptype, null_sptype = spectral_types(rs, size)
+    return [
+        (hip, None),
+        (rs.uniform(0, 360, size), None),
+        (np.degrees(np.arcsin(rs.uniform(-1, 1, size))), None),
+        (np.clip(plx, -999, 9999), null_plx),
+        (np.clip(e_plx, 0, 999), null_plx),
+        (np.clip(rs.normal(0, 40, size), -9999, 99999), null_pm),
+        (np.clip(rs.normal(0, 40, size), -9999, 99999), null_pm),
+        (np.clip(1000 / np.maximum(plx, 0.01), 0, 99999), ~has_dist),
+        (sptype, null_sptype),
+    ]
+
+def photo_values(rs, hip):
+    size = len(hip)
+    return [
+        (hip, None),
+        (np.clip(rs.normal(8.3, 1.3, size), -1.5, 14.5),
+         rs.random_sample(size) < NULL_VMAG),
+        (np.clip(rs.normal(0.7, 0.45, size), -0.4, 5.4),
+         rs.random_sample(size) < NULL_BV),
+    ]
+
+def format_rows(layout, values):
+    # Builds the fixed-width records for one chunk as a single byte string
+    size = len(values[0][0])
+    lrecl = layout[-1][2]
+    records = np.full((size, lrecl + 1), ord(' '), dtype=np.uint8)
+    records[:, -1] = ord('\n')
+    for (_, start, end, fmt, _, _, _), (column, null) in zip(layout, values):
+        width = end - start + 1
+        text = np.char.mod(_printf(fmt).encode('ascii'), column)
+        if text.dtype.itemsize > width:
+            raise ValueError('%s value too wide for %s' % (fmt, text.max()))
+        field = np.frombuffer(text.astype('S%d' % width).tobytes(),
+                              dtype=np.uint8).reshape(size, width).copy()
+        field[field == 0] = ord(' ')
+        if null is not None:
+            field[null] = ord(' ')
+        records[:, start-1:end] = field
+    return records.tobytes()
+
+def generate(outdir, rows, seed=None, chunk_rows=CHUNK_ROWS,
+             missing_photo=MISSING_PHOTO):
+    rs = np.random.RandomState(seed)
+    if not os.path.isdir(outdir):
+        os.makedirs(outdir)
+
+    # HIP numbers increase with occasional gaps, as in the real catalogue,
+    # so they never exceed twice the row count
+    maxhip = 2 * rows
+    main_layout = _layout(_hip_format(MAIN_COLUMNS, maxhip))
+    photo_layout = _layout(_hip_format(PHOTO_COLUMNS, maxhip))
+
+    hip = 0
+    photo_rows = 0
+    with open(os.path.join(outdir, 'main.dat'), 'wb') as mainfile, \
+            open(os.path.join(outdir, 'photo.dat'), 'wb') as photofile:
+        for start in range(0, rows, chunk_rows):
+            size = min(chunk_rows, rows - start)
+            hips = hip + np.cumsum(1 + (rs.random_sample(size) < 0.02))
+            hip = int(hips[-1])
+            mainfile.write(format_rows(main_layout, main_values(rs, hips)))
+            hips = hips[rs.random_sample(size) >= missing_photo]
+            photo_rows += len(hips)
+            photofile.write(format_rows(photo_layout, photo_values(rs, hips)))
+
+    # written last, as it gives the number of photometry rows
+    write_readme(os.path.join(outdir, 'ReadMe'), main_layout, photo_layout,
+                 rows, photo_rows)
+
+def main():
+    argparser = argparse.ArgumentParser(
+        description='Write a synthetic catalogue in a reduced XHIP '
+                    'layout.')
+    argparser.add_argument('-n', '--rows', type=int, default=117955,
+                           help='number of stars (default 117955)')
+    argparser.add_argument('-o', '--outdir', default='.',
+                           help='directory for ReadMe, main.dat and '
+                                'photo.dat')
+    argparser.add_argument('-s', '--seed', type=int, default=None,
+                           help='random seed, for repeatable output')
+    argparser.add_argument('--missing-photometry', type=float,
+                           default=MISSING_PHOTO, metavar='FRACTION',
+                           help='fraction of stars left out of photo.dat '
+                                '(default %g)' % MISSING_PHOTO)
+    args = argparser.parse_args()
+    if not 0 <= args.missing_photometry <= 1:
+        argparser.error('--missing-photometry must be between 0 and 1')
+
+    generate(args.outdir, args.rows, args.seed,
+             missing_photo=args.missing_photometry)
+
+if __name__ == '__main__':
+    main()